@@ -1,11 +1,10 @@
 from parts import *
 from connections2 import *
 from curve import *
+from curve_index import CurveIndex
+import solver_stats
 from collections import defaultdict
-from scipy.optimize import minimize
-from matplotlib import pyplot as plt
-from sklearn.decomposition import PCA
-from tqdm import tqdm
+import copy
 from os.path import join as pjoin
 
 
@@ -24,13 +23,43 @@ def describe_comp(comp):
     return comp_desc
 
 
+def is_planar_assembly(connections, components):
+    """
+    :return: True if every component lies in the xy plane (z = gamma = beta = 0) and every connection
+             keeps it there, so the assembly can be solved over x, y and alpha only
+    """
+    return (all(con.is_planar() for con in connections) and
+            all(not comp.configuration.position.z and not comp.configuration.alignment.gamma and
+                not comp.configuration.alignment.beta for comp in components))
+
+
 class Assembly:
     id_counter = 0
+    # 'bfgs', 'sparse' (sparse least squares) or 'auto' - sparse from SPARSE_SOLVER_MIN_PARAMS params on
+    solver = 'auto'
+    SPARSE_SOLVER_MIN_PARAMS = 60
+    # compute the params that fixed and phase connections determine before solving, False solves for all params
+    presolve_params = True
+    # assemblies pickled before the planar model are 3D
+    planar = False
+    # solver_stats.SolverStats of this assembly, created when stats are enabled
+    stats = None
 
     def __init__(self, connection_list, components, actuator=None, iters=100, tol=1e-4, plot_newt=False,
-                 red_point_component=None):
+                 red_point_component=None, initial_state=None, solve=True, planar=None, local_ids=True):
+        """
+        :param initial_state: dict param -> value to start the solver from, params not in it start at 0
+        :param solve: solve the assembly right away
+        :param planar: solve over x, y and alpha of every component only (3 params instead of 6),
+                       None detects it from the connections and components
+        :param local_ids: renumber the components and connections 0, 1, .. (see assign_local_ids),
+                          False keeps the ids they have
+        """
         self.components = components
         self.con_list = connection_list
+        if local_ids:
+            self.assign_local_ids()
+        self.planar = is_planar_assembly(connection_list, components) if planar is None else planar
         self.iterations = iters
         self.tolerance = tol
         self.actuator = actuator
@@ -39,34 +68,216 @@ class Assembly:
         # self.const_deriv = self.get_assembly_constraints_deriv()
         self.const_deriv = self.get_assembly_constraints_deriv2()
         self.cur_state = self.free_params_in_assembly()
+        if initial_state:
+            self.seed_state(initial_state)
         self.plot_newt = plot_newt
         self.red_point_component = red_point_component
 
         # make sure the assembly is valid
         # if not self.update_state():
-        self.update_state2()
+        if solve:
+            self.update_state2()
         #     print("Failed")
         # raise Exception("assembly failed to init")
         self.id = Assembly.id_counter
         Assembly.id_counter += 1
 
-    def merge_assembly(self, other_asm):
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        # assemblies pickled before the evaluation plan existed
+        if '_plan' not in state:
+            self.const, self.param_index = self.get_assembly_constraint2()
+            self.const_deriv = self.get_assembly_constraints_deriv2()
+        elif '_free_idx' not in state:
+            self._compile_presolve()
+
+    def all_components(self):
+        """
+        :return: the components of the assembly followed by the ones that only appear in its connections
+        """
+        components = list(self.components)
+        for con in self.con_list:
+            components += [comp for comp in con.get_components() if not any(comp is c for c in components)]
+        return components
+
+    def next_component_id(self):
+        return max((comp.id for comp in self.all_components()), default=-1) + 1
+
+    def assign_local_ids(self):
+        """
+        number the components of the assembly 0, 1, .. (see all_components) and the connections in their order.
+        params keys (component id, name) then don't depend on how many components the process created before,
+        so assemblies built in different processes or loaded from different dbs don't collide
+        """
+        for i, comp in enumerate(self.all_components()):
+            comp.id = i
+        for i, con in enumerate(self.con_list):
+            con.id = i
+            con.refresh_params()
+
+    def renumber_components(self, start):
+        """
+        move the component ids of the assembly to start, start + 1, .. and rekey the params, the state
+        stays valid. used before merging the assembly into another one, so their ids don't collide
+        """
+        components = self.all_components()
+        new_ids = {comp.id: start + i for i, comp in enumerate(components)}
+        for comp in components:
+            comp.id = new_ids[comp.id]
+        for con in self.con_list:
+            con.refresh_params()
+        self.param_index = {(new_ids[p[0]], p[1]): i for p, i in self.param_index.items()}
+        self.cur_state = {(new_ids[p[0]], p[1]): v for p, v in self.cur_state.items()}
+        self._compile_presolve()
+
+    def _compile_connections(self, connections):
+        """
+        :return: the evaluation plan of connections: for every connection its constraint function,
+                 its derivative function and the positions of its params in the state vector
+        """
+        if self.planar:
+            return [(con.get_planar_constraint()[0], con.get_planar_constraint_prime()[0],
+                     np.array([self.param_index[p] for p in con.get_planar_free_params()], dtype=int))
+                    for con in connections]
+        return [(con.get_constraint_by_the_book()[0], con.get_constraint_prime_by_the_book()[0],
+                 np.array([self.param_index[p] for p in con.get_free_params()], dtype=int))
+                for con in connections]
+
+    def _compile_presolve(self):
+        """
+        find the params that fixed and phase connections determine, in an order they can be computed in.
+        they are substituted before solving and only the rest of the params are optimized
+        """
+        determined = {}
+        changed = self.presolve_params
+        while changed:
+            changed = False
+            for con in self.con_list:
+                for param, compute in con.get_determined_params(determined).items():
+                    if param in self.param_index and param not in determined:
+                        determined[param] = compute
+                        changed = True
+        self._determined = [(self.param_index[p], compute) for p, compute in determined.items()]
+        determined_idx = {i for i, _ in self._determined}
+        self._free_idx = np.array([i for i in range(len(self.param_index)) if i not in determined_idx], dtype=int)
+
+    def presolve(self):
+        """
+        :return: the current state array with the determined params set to their values
+        """
+        state = self.get_cur_state_array().astype(np.float64)
+        for i, compute in self._determined:
+            state[i] = compute(lambda p: state[self.param_index[p]])
+        return state
+
+    def _free_state(self, state):
+        """
+        :param state: a presolved state array
+        :return: a function from the free params values to the full state array
+        """
+        def full_state(free_values):
+            full = state.copy()
+            full[self._free_idx] = free_values
+            return full
+
+        return full_state
+
+    def connection_params(self, con):
+        """
+        :return: the params of con that are solved for, in the order of its constraint arguments
+        """
+        return con.get_planar_free_params() if self.planar else con.get_free_params()
+
+    def seed_state(self, state):
+        """
+        set the current value of every param of the assembly that appears in state
+        """
+        for param, value in state.items():
+            if param in self.cur_state:
+                self.cur_state[param] = value
+
+    def extend_assembly(self, components, connections, initial_state=None, solve=True):
+        """
+        add components and connections to this assembly in place.
+        new params are appended to the end of the state vector and the evaluation plan is extended,
+        nothing that was already compiled is rebuilt
+        new components whose id is already used in the assembly are given new ids
+        :param initial_state: dict param -> value for the new params, e.g. the solved state of the
+                              assembly the components come from
+        :param solve: solve the extended assembly, starting from the current state
         """
-        returns a new assembly made of self and other assembly
+        if self.planar and not is_planar_assembly(connections, components):
+            raise ValueError("can't extend a planar assembly with non planar connections or components")
+        known = self.all_components()
+        new_components = []
+        for comp in list(components) + [c for con in connections for c in con.get_components()]:
+            if not any(comp is c for c in known + new_components):
+                new_components.append(comp)
+        used_ids = {comp.id for comp in known}
+        next_id = max([comp.id for comp in known + new_components], default=-1) + 1
+        new_ids = {}
+        for comp in new_components:
+            if comp.id in used_ids:
+                new_ids[comp.id], comp.id = next_id, next_id
+                next_id += 1
+            used_ids.add(comp.id)
+        if initial_state:
+            new_component_ids = {comp.id for comp in new_components}
+            initial_state = {(new_ids.get(p[0], p[0]), p[1]): v for p, v in initial_state.items()}
+            initial_state = {p: v for p, v in initial_state.items() if p[0] in new_component_ids}
+        for i, con in enumerate(connections):
+            con.id = len(self.con_list) + i
+            con.refresh_params()
+
+        self.components += [comp for comp in components if any(comp is c for c in new_components)]
+        self.con_list += connections
+        for con in connections:
+            for param in self.connection_params(con):
+                if param not in self.param_index:
+                    self.param_index[param] = len(self.param_index)
+                    self.cur_state[param] = 0
+        if initial_state:
+            self.seed_state({p: v for p, v in initial_state.items() if p in self.cur_state})
+        self._plan += self._compile_connections(connections)
+        self._compile_presolve()
+        if solve:
+            self.update_state2()
+        return self
+
+    def merge_assembly(self, other_asm, extra_connections=(), solve=True):
+        """
+        returns a new assembly made of self and other assembly, and extra connections between them.
+        the merged state starts from the solved states of both assemblies.
+        other is merged as a copy whose components are renumbered after the ones of self, so other keeps
+        its own ids and poses
+        :param extra_connections: connections between components of self and of other, they are copied along
         :return:
         """
-        return Assembly(self.con_list + other_asm.con_list,
-                        components=self.components + other_asm.components,
-                        actuator=other_asm.actuator or self.actuator,
-                        iters=self.iterations,
-                        tol=self.tolerance,
-                        plot_newt=self.plot_newt,
-                        red_point_component=other_asm.red_point_component or self.red_point_component)
+        # the components of self are kept as they are in the copy of other and of the extra connections
+        memo = {id(comp): comp for comp in self.all_components()}
+        other_asm, extra_connections = copy.deepcopy((other_asm, list(extra_connections)), memo)
+        planar = (self.planar and other_asm.planar and
+                  is_planar_assembly(extra_connections, self.components + other_asm.components))
+        merged = Assembly(list(self.con_list),
+                          components=list(self.components),
+                          actuator=other_asm.actuator or self.actuator,
+                          iters=self.iterations,
+                          tol=self.tolerance,
+                          plot_newt=self.plot_newt,
+                          red_point_component=other_asm.red_point_component or self.red_point_component,
+                          initial_state=self.cur_state,
+                          solve=False,
+                          planar=planar,
+                          local_ids=False)
+        other_asm.renumber_components(merged.next_component_id())
+        return merged.extend_assembly(other_asm.components, other_asm.con_list + list(extra_connections),
+                                      initial_state=other_asm.cur_state, solve=solve)
 
     def describe_assembly(self):
         return [describe_comp(c) for c in self.components]
 
     def plot_assembly(self, plot_path=None, image_number=None, save_images=False, user_fig=None, fig_tup=None):
+        from matplotlib import pyplot as plt
         if fig_tup is None:
             fig, ax = plt.subplots()
         else:
@@ -133,6 +344,8 @@ class Assembly:
                 and the index (dict(param:position)) of the params
         """
         self.param_index = {p: i for i, p in enumerate(self.free_params_in_assembly())}
+        self._plan = self._compile_connections(self.con_list)
+        self._compile_presolve()
 
         def assembly_const(param_list):
             """
@@ -140,15 +353,8 @@ class Assembly:
                                must be ordered according to param_index
             :return: sum of constraints parameterized with param_list
             """
-            result = []
-            for i, con in enumerate(self.con_list):
-                connection_const_res = con.get_constraint_by_the_book()[0](
-                    *[param_list[self.param_index[p]] for p in con.get_free_params()])
-                # result += connection_const_res
-                result = result + connection_const_res
-                # self.plot_assembly()
-            self.C = np.array(result)
-            return 0.5 * np.array(result) @ np.array(result)
+            self.C = self.constraint_residuals(param_list)
+            return 0.5 * self.C @ self.C
 
         return assembly_const, self.param_index
 
@@ -159,7 +365,7 @@ class Assembly:
         :return: the constrain describing the whole assemply
                 and the index (dict(param:position)) of the params
         """
-        self.const(np.zeros(len(self.components) * 6))
+        self.const(np.zeros(len(self.param_index)))
 
         def assembly_const_deriv(param_list):
             """
@@ -167,36 +373,54 @@ class Assembly:
                                must be ordered according to param_index
             :return: sum of constraints parameterized with param_list
             """
-            doCdoSt = np.zeros((len(self.C), len(self.param_index)))
+            # C @ dC/dSt, accumulated block by block without building the jacobian
+            result = np.zeros(len(self.param_index))
             row = 0
-            for i, con in enumerate(self.con_list):
-                gradient = con.get_constraint_prime_by_the_book()[0](
-                    *[param_list[self.param_index[p]] for p in con.get_free_params()])
-                gradient = np.array(gradient)
-                # 1D
-                if gradient.size == gradient.shape[0]:
-                    for j, p in enumerate(con.get_free_params()):
-                        doCdoSt[row, self.param_index[p]] = gradient[j]
-                    row += 1
-
-                else:
-                    for l in range(gradient.shape[0]):
-                        for j, p in enumerate(con.get_free_params()):
-                            doCdoSt[row + l, self.param_index[p]] = gradient[l, j]
-                    row += gradient.shape[0]
-
-                # C = con.get_constraint_by_the_book()[0](*[param_list[self.param_index[p]] for p in con.get_free_params()])
-                # if len(C) > 1:
-                #     local_grad = np.array(C) @ gradient
-                # else:
-                #     local_grad = np.array(C) * gradient
-                # for j,p in enumerate(con.get_free_params()):
-                #     res[self.param_index[p]] += local_grad[j]
-
-            return self.C @ doCdoSt
+            for _, const_prime, idx in self._plan:
+                # 1D gradients are a single constraint row
+                gradient = np.atleast_2d(const_prime(*param_list[idx]))
+                result[idx] += self.C[row:row + gradient.shape[0]] @ gradient
+                row += gradient.shape[0]
+
+            return result
 
         return assembly_const_deriv
 
+    def constraint_residuals(self, param_list):
+        """
+        :param param_list: the state vector, ordered according to param_index
+        :return: the vector of all the constraint values, ordered like the evaluation plan
+        """
+        return np.concatenate([np.asarray(const(*param_list[idx]), dtype=np.float64).ravel()
+                               for const, _, idx in self._plan])
+
+    def _jacobian_pattern(self, blocks):
+        """
+        :return: row and column of every entry of the jacobian blocks, cached until the plan changes
+        """
+        if getattr(self, '_pattern', None) is None or self._pattern[0] != len(self._plan):
+            rows, cols = [], []
+            row = 0
+            for block, (_, _, idx) in zip(blocks, self._plan):
+                block_rows = np.arange(row, row + block.shape[0])
+                rows.append(np.repeat(block_rows, len(idx)))
+                cols.append(np.tile(idx, block.shape[0]))
+                row += block.shape[0]
+            self._pattern = (len(self._plan), np.concatenate(rows), np.concatenate(cols), row)
+        return self._pattern[1:]
+
+    def constraint_jacobian(self, param_list):
+        """
+        :param param_list: the state vector, ordered according to param_index
+        :return: the jacobian of constraint_residuals as a sparse csr matrix,
+                 every connection only fills the block of its own rows and params
+        """
+        from scipy.sparse import csr_matrix
+        blocks = [np.atleast_2d(const_prime(*param_list[idx])) for _, const_prime, idx in self._plan]
+        rows, cols, n_rows = self._jacobian_pattern(blocks)
+        data = np.concatenate([block.ravel() for block in blocks])
+        return csr_matrix((data, (rows, cols)), shape=(n_rows, len(self.param_index)))
+
     def get_assembly_constraints_deriv(self):
         """
         generates a master constraint that can be optimized via Newton Raphson
@@ -233,7 +457,7 @@ class Assembly:
         """
         params = {}
         for const in self.con_list:
-            params.update(const.get_free_params())
+            params.update(self.connection_params(const))
         return params
 
     def free_params_cnt_in_assembly(self):
@@ -244,7 +468,7 @@ class Assembly:
         """
         params = {}
         for const in self.con_list:
-            params.update(const.get_free_params())
+            params.update(self.connection_params(const))
         return len(params)
 
     # def update_state(self):
@@ -279,14 +503,47 @@ class Assembly:
 
         :return: True/False to indicate convergance
         '''
-        x = self.get_cur_state_array()
-        res = minimize(self.const, x, method='Powell')
+        from scipy.optimize import minimize
+        start_time = solver_stats.start()
+        state = self.presolve()
+        full_state = self._free_state(state)
+        res = minimize(lambda free_values: self.const(full_state(free_values)), state[self._free_idx],
+                       method='Powell')
+        solver_stats.record_solve(self, start_time, res, res.success)
         if res.success:
-            self.update_cur_state_from_array(res['x'])
-            x = self.get_cur_state_array()
-            # print(self.const(x))
+            self.update_cur_state_from_free(res['x'])
+            return True
+        else:
+            return False
+
+    def uses_sparse_solver(self):
+        if self.solver == 'auto':
+            return len(self.param_index) >= self.SPARSE_SOLVER_MIN_PARAMS
+        return self.solver == 'sparse'
+
+    def update_state_sparse(self):
+        '''
+        solve the constraints by least squares over the sparse jacobian, for large composed assemblies
+        :return: True/False to indicate convergance
+        '''
+        from scipy.optimize import least_squares
+        start_time = solver_stats.start()
+        x = self.get_cur_state_array()
+        state = self.presolve()
+        full_state = self._free_state(state)
+        res = least_squares(lambda free_values: self.constraint_residuals(full_state(free_values)),
+                            state[self._free_idx],
+                            jac=lambda free_values: self.constraint_jacobian(full_state(free_values))[:, self._free_idx],
+                            method='trf', tr_solver='lsmr')
+        success = res.success and np.linalg.norm(res.fun) < self.tolerance
+        solver_stats.record_solve(self, start_time, res, success)
+        if success:
+            self.update_cur_state_from_free(res.x)
             return True
         else:
+            # change starting guess
+            if x.mean() == 0:
+                self.update_cur_state_from_free(res.x)
             return False
 
     def update_state2(self):
@@ -294,18 +551,41 @@ class Assembly:
 
         :return: True/False to indicate convergance
         '''
+        if self.uses_sparse_solver():
+            return self.update_state_sparse()
+        from scipy.optimize import minimize
+        start_time = solver_stats.start()
         x = self.get_cur_state_array()
-        res = minimize(self.const, x, method='BFGS', jac=self.const_deriv)
+        state = self.presolve()
+        full_state = self._free_state(state)
+        res = minimize(lambda free_values: self.const(full_state(free_values)), state[self._free_idx], method='BFGS',
+                       jac=lambda free_values: self.const_deriv(full_state(free_values))[self._free_idx])
+        solver_stats.record_solve(self, start_time, res, res.success)
         if res.success:
-            self.update_cur_state_from_array(res['x'])
+            self.update_cur_state_from_free(res['x'])
             return True
         else:
             # change starting guess
             if x.mean() == 0:
-                self.update_cur_state_from_array(res['x'])
+                self.update_cur_state_from_free(res['x'])
             return False
 
+    def update_cur_state_from_free(self, free_values):
+        """
+        :param free_values: the values of the free params only (a solver result), the determined params are
+                            reinserted
+        """
+        state = self.presolve()
+        state[self._free_idx] = free_values
+        self.update_cur_state_from_array(state)
+
     def update_cur_state_from_array(self, new_state_array):
+        """
+        :param new_state_array: the full state array, ordered according to param_index
+        """
+        if len(new_state_array) != len(self.param_index):
+            raise ValueError(f"expected a state of {len(self.param_index)} params, got {len(new_state_array)}"
+                             f" (use update_cur_state_from_free for the free params only)")
         for param, idx in self.param_index.items():
             self.cur_state[param] = new_state_array[idx]
         for i, comp in enumerate(self.components):
@@ -460,14 +740,13 @@ class StickFigure(Assembly):
         Assembly.__init__(self, con_lst, comp_lst)
 
     def add_driving_assembly(self, driving_mec):
-        combined_asm = self.merge_assembly(driving_mec)
         redp_comp = driving_mec.red_point_component
-        combined_asm.con_list = combined_asm.con_list + [PinConnection2(self.comp_dict['rhand2'],
-                                                                        redp_comp,
-                                                                        Point(self.comp_dict['rhand2'].length, 0, 0),
-                                                                        Point(redp_comp.length, 0, 0),
-                                                                        Alignment(0, 0, 0), Alignment(0, 0, 0))]
-        return combined_asm
+        return self.merge_assembly(driving_mec,
+                                   extra_connections=[PinConnection2(self.comp_dict['rhand2'],
+                                                                     redp_comp,
+                                                                     Point(self.comp_dict['rhand2'].length, 0, 0),
+                                                                     Point(redp_comp.length, 0, 0),
+                                                                     Alignment(0, 0, 0), Alignment(0, 0, 0))])
 
 
 class StickSnake(Assembly):
@@ -510,55 +789,92 @@ class StickSnake(Assembly):
         Assembly.__init__(self, con_lst, comp_lst)
 
     def add_driving_assembly(self, driving_mec):
-        combined_asm = self.merge_assembly(driving_mec)
         redp_comp = driving_mec.red_point_component
-        combined_asm.con_list = combined_asm.con_list + [PinConnection2(self.comp_dict['stick5'],
-                                                                        redp_comp,
-                                                                        Point(self.comp_dict['stick5'].length, 0, 0),
-                                                                        Point(redp_comp.length, 0, 0),
-                                                                        Alignment(0, 0, 0),
-                                                                        Alignment(0, 0, 0))]
-        return combined_asm
+        return self.merge_assembly(driving_mec,
+                                   extra_connections=[PinConnection2(self.comp_dict['stick5'],
+                                                                     redp_comp,
+                                                                     Point(self.comp_dict['stick5'].length, 0, 0),
+                                                                     Point(redp_comp.length, 0, 0),
+                                                                     Alignment(0, 0, 0),
+                                                                     Alignment(0, 0, 0))])
+
+
+# the parameter groups sample_config_from_current mutates, in sampling order
+MUTATION_GROUPS = ("gear1", "gear2", "stick1", "gear1_stick1_joint", "gear2_stick2_joint", "stick1_stick2_joint",
+                   "stick2_stick1_joint", "gear1_position", "gear2_position", "stick2")
 
 
 def sample_from_cur_assemblyA(assemblyA, gear_diff_val=0.5, stick_diff_val=0.5, position_diff_val=0.5, random_sample=1,
-                              second_type=False):
-    config = assemblyA.config
+                              second_type=False, rng=random):
+    """
+    :param rng: source of randomness, a random.Random (or the random module itself)
+    """
+    # the samplers below modify the config in place, the parent assembly keeps its own
+    config = copy.deepcopy(assemblyA.config)
+    sample_config_from_current(config, gear_diff_val, stick_diff_val, position_diff_val,
+                               mutation_probs=dict.fromkeys(MUTATION_GROUPS, random_sample), second_type=second_type,
+                               rng=rng)
+    return AssemblyA(config)
+
 
-    if random.random() < random_sample:
+def sample_config_from_current(config, gear_diff_val=0.5, stick_diff_val=0.5, position_diff_val=0.5,
+                               mutation_probs=None, step_scales=None, second_type=False, rng=random):
+    """
+    mutate an AssemblyA config in place
+    :param mutation_probs: dict group (see MUTATION_GROUPS) -> probability the group is mutated, 1 by default
+    :param step_scales: dict group -> factor of the diff value the group is sampled with, 1 by default
+    :return: list of the mutated groups
+    """
+    mutated = []
+
+    def mutate(group):
+        if rng.random() < (mutation_probs[group] if mutation_probs else 1):
+            mutated.append(group)
+            return True
+        return False
+
+    def scale(group):
+        return step_scales[group] if step_scales else 1
+
+    if mutate("gear1"):
         config["gear1_init_parameters"] = sample_gear_parameters_from_current(config["gear1_init_parameters"],
-                                                                              gear_diff_val)
-    if random.random() < random_sample:
+                                                                              gear_diff_val * scale("gear1"), rng=rng)
+    if mutate("gear2"):
         config["gear2_init_parameters"] = sample_gear_parameters_from_current(config["gear2_init_parameters"],
-                                                                              gear_diff_val, second_gear=True, \
-                                                                              gear1_radius=
+                                                                              gear_diff_val * scale("gear2"),
+                                                                              second_gear=True, gear1_radius=
                                                                               config["gear1_init_parameters"]["radius"],
-                                                                              second_type=second_type)
-    if random.random() < random_sample:
+                                                                              second_type=second_type, rng=rng)
+    if mutate("stick1"):
         config["stick1_init_parameters"] = sample_stick_parameters_from_current(config["stick1_init_parameters"],
-                                                                                stick_diff_val)
+                                                                                stick_diff_val * scale("stick1"),
+                                                                                rng=rng)
 
-    if random.random() < random_sample:
+    if mutate("gear1_stick1_joint"):
         config["gear1_stick1_joint_location"] = sample_position(config["gear1_stick1_joint_location"],
-                                                                position_diff_val, num_of_axis=2)
+                                                                position_diff_val * scale("gear1_stick1_joint"),
+                                                                num_of_axis=2, rng=rng)
 
-    if random.random() < random_sample:
+    if mutate("gear2_stick2_joint"):
         config["gear2_stick2_joint_location"] = sample_position(config["gear2_stick2_joint_location"],
-                                                                position_diff_val, num_of_axis=2)
-    if random.random() < random_sample:
+                                                                position_diff_val * scale("gear2_stick2_joint"),
+                                                                num_of_axis=2, rng=rng)
+    if mutate("stick1_stick2_joint"):
         config["stick1_stick2_joint_location"] = sample_position(config["stick1_stick2_joint_location"],
-                                                                 position_diff_val, num_of_axis=1,
-                                                                 enable_negative=False)
-    if random.random() < random_sample:
+                                                                 position_diff_val * scale("stick1_stick2_joint"),
+                                                                 num_of_axis=1, enable_negative=False, rng=rng)
+    if mutate("stick2_stick1_joint"):
         config["stick2_stick1_joint_location"] = (config["stick2_init_parameters"]["length"], 0, 0)
 
-    if random.random() < random_sample:
-        config["gear1_fixed_position"] = sample_position(config["gear1_fixed_position"], position_diff_val,
-                                                         num_of_axis=2)
-    if random.random() < random_sample:
-        config["gear2_fixed_position"] = sample_position(config["gear2_fixed_position"], position_diff_val,
-                                                         num_of_axis=2)
-    if random.random() < random_sample:
+    if mutate("gear1_position"):
+        config["gear1_fixed_position"] = sample_position(config["gear1_fixed_position"],
+                                                         position_diff_val * scale("gear1_position"),
+                                                         num_of_axis=2, rng=rng)
+    if mutate("gear2_position"):
+        config["gear2_fixed_position"] = sample_position(config["gear2_fixed_position"],
+                                                         position_diff_val * scale("gear2_position"),
+                                                         num_of_axis=2, rng=rng)
+    if mutate("stick2"):
         radius1 = config["gear1_init_parameters"]["radius"]
         radius2 = config["gear2_init_parameters"]["radius"]
         gears_dis = points_distance(config["gear1_fixed_position"], config["gear2_fixed_position"])
@@ -566,65 +882,67 @@ def sample_from_cur_assemblyA(assemblyA, gear_diff_val=0.5, stick_diff_val=0.5,
 
         stick2_len_params = (radius1, radius2, gears_dis, stick1_part_len)
         config["stick2_init_parameters"] = sample_stick_parameters_from_current(config["stick2_init_parameters"],
-                                                                                stick_diff_val, stick2_len_params)
-    return AssemblyA(config)
+                                                                                stick_diff_val * scale("stick2"),
+                                                                                stick2_len_params, rng=rng)
+    return mutated
 
 
-def sample_radius_from_current(radius, diff_val=2, min_radius=0.1):
+def sample_radius_from_current(radius, diff_val=2, min_radius=0.1, rng=random):
     if radius < 0.5:
-        return round(max(min_radius, radius + random.uniform(-diff_val * radius, diff_val)), 2)
-    return round(max(min_radius, radius + random.uniform(-diff_val, diff_val)), 2)
+        return round(max(min_radius, radius + rng.uniform(-diff_val * radius, diff_val)), 2)
+    return round(max(min_radius, radius + rng.uniform(-diff_val, diff_val)), 2)
 
 
-def sample_gear_parameters_from_current(gear_param, diff_val=2, second_gear=False, gear1_radius=0.0, second_type=False):
+def sample_gear_parameters_from_current(gear_param, diff_val=2, second_gear=False, gear1_radius=0.0, second_type=False,
+                                        rng=random):
     if second_gear:
         assert gear1_radius > 0
-        power = random.choice([-1, 0])
-        num = random.choice([2, 3])
+        power = rng.choice([-1, 0])
+        num = rng.choice([2, 3])
         if second_type:
             power = -1
             num = 2
         gear_param["radius"] = gear1_radius * (num ** power)
     else:
-        gear_param["radius"] = round(sample_radius_from_current(gear_param["radius"], diff_val=diff_val), 2)
+        gear_param["radius"] = round(sample_radius_from_current(gear_param["radius"], diff_val=diff_val, rng=rng), 2)
     return gear_param
 
 
-def sample_length_from_current(length, diff_val=2, min_length=0.1):
+def sample_length_from_current(length, diff_val=2, min_length=0.1, rng=random):
     if length < 0.5:
-        return round(max(min_length, length + random.uniform(-diff_val * length, diff_val)), 2)
-    return round(max(min_length, length + random.uniform(-diff_val, diff_val)), 2)
+        return round(max(min_length, length + rng.uniform(-diff_val * length, diff_val)), 2)
+    return round(max(min_length, length + rng.uniform(-diff_val, diff_val)), 2)
 
 
-def sample_stick_parameters_from_current(stick_param, diff_val=2, stick2_len_params=None):
+def sample_stick_parameters_from_current(stick_param, diff_val=2, stick2_len_params=None, rng=random):
     if stick2_len_params:
         radius1, radius2, gears_dis, stick1_part_len = stick2_len_params
         min_val = gears_dis + radius1 + radius2 - stick1_part_len
         max_val = gears_dis - radius1 + stick1_part_len
         if min_val < max_val:
             stick_param["length"] = round(
-                random.uniform(gears_dis + radius1 + radius2 - stick1_part_len, gears_dis - radius1 + stick1_part_len),
+                rng.uniform(gears_dis + radius1 + radius2 - stick1_part_len, gears_dis - radius1 + stick1_part_len),
                 2)
             return stick_param
 
-    stick_param["length"] = round(sample_length_from_current(stick_param["length"], diff_val=diff_val), 2)
+    stick_param["length"] = round(sample_length_from_current(stick_param["length"], diff_val=diff_val, rng=rng), 2)
     return stick_param
 
 
-def sample_position(joint_location, diff_val=2, num_of_axis=3, enable_negative=True):
+def sample_position(joint_location, diff_val=2, num_of_axis=3, enable_negative=True, rng=random):
     for i in range(num_of_axis):
-        new_pos = round(joint_location[i] + random.uniform(-diff_val, diff_val), 2)
+        new_pos = round(joint_location[i] + rng.uniform(-diff_val, diff_val), 2)
         if not enable_negative:
             while new_pos < 0:
-                new_pos = round(joint_location[i] + random.uniform(-diff_val, diff_val), 2)
+                new_pos = round(joint_location[i] + rng.uniform(-diff_val, diff_val), 2)
         joint_location[i] = new_pos
 
     return joint_location
 
 
-def sample_point(point, diff_val=2, num_of_axis=3):
+def sample_point(point, diff_val=2, num_of_axis=3, rng=random):
     vector = point.vector()
-    vector = sample_position(vector, diff_val=diff_val, num_of_axis=num_of_axis)
+    vector = sample_position(vector, diff_val=diff_val, num_of_axis=num_of_axis, rng=rng)
     return Point(*vector)
 
 
@@ -693,26 +1011,136 @@ def is_vaild_assembleA(assemblyA, debug_mode=False):
 
 
 def is_dissimilar(curve, database, gamma=1):
+    """
+    :param database: list of curves or a CurveIndex
+    :return: True if no curve in database is closer than gamma to curve
+    """
+    if isinstance(database, CurveIndex):
+        return not database.any_within(curve, gamma)
     for database_curve in database:
         if Curve.normA(curve, database_curve) < gamma:
             return False
     return True
 
 
+class TraceMonitor:
+    '''
+    checks every step of a curve trace for a lost branch. a step is broken when:
+    - the solver failed
+    - the pose doesn't close. the solver minimizes the squared constraints and reports success at the closest
+      pose when the assembly can't reach the actuator angle (a rocker turned out of its range)
+    - the constraint jacobian of the free params is nearly singular (a toggle position)
+    - a free angle turned a lot more than the actuator since the last step (a jump to another assembly branch)
+    '''
+    # on sampled assemblies, clean traces keep residual norms under 4e-5, inverse condition numbers over 1e-2
+    # and angle steps under 3 actuator steps
+    max_residual = 1e-3
+    min_inverse_condition = 1e-6
+    max_angle_step_ratio = 8
+    # the conditioning takes a dense svd, it is only checked every condition_every steps
+    # and at steps whose residual norm is over condition_residual
+    condition_every = 8
+    condition_residual = 1e-4
+
+    def __init__(self, assembly, actuator_step):
+        """
+        :param actuator_step: degrees the actuator turns every step
+        """
+        self.assembly = assembly
+        self.max_angle_step = self.max_angle_step_ratio * np.deg2rad(abs(actuator_step))
+        free_idx = set(assembly._free_idx)
+        self._angle_idx = np.array([i for param, i in assembly.param_index.items()
+                                    if param[1] in ('alpha', 'beta', 'gamma') and i in free_idx], dtype=int)
+        self._previous = assembly.presolve()
+        self._steps = 0
+        # why the trace broke, None while it is clean
+        self.reason = None
+
+    def check(self, converged):
+        """
+        :param converged: whether the solve of this step converged
+        :return: True if the step stayed on the traced branch, otherwise the reason is kept
+        """
+        state = self.assembly.presolve()
+        self._steps += 1
+        residual = np.linalg.norm(self.assembly.constraint_residuals(state)) if converged else np.inf
+        if not converged:
+            self.reason = 'solver failed'
+        elif residual > self.max_residual:
+            self.reason = 'pose does not close'
+        elif ((self._steps % self.condition_every == 1 or residual > self.condition_residual) and
+              self._inverse_condition(state) < self.min_inverse_condition):
+            self.reason = 'singular jacobian'
+        elif self._max_angle_step(state) > self.max_angle_step:
+            self.reason = 'angle jump'
+        self._previous = state
+        return self.reason is None
+
+    def _max_angle_step(self, state):
+        if not self._angle_idx.size:
+            return 0.0
+        # wrapped to [-pi, pi]
+        turned = np.angle(np.exp(1j * (state[self._angle_idx] - self._previous[self._angle_idx])))
+        return np.max(np.abs(turned))
+
+    def _inverse_condition(self, state):
+        singular_values = np.linalg.svd(self.assembly.constraint_jacobian(state)[:, self.assembly._free_idx].toarray(),
+                                        compute_uv=False)
+        return singular_values[-1] / singular_values[0] if singular_values[0] > 0 else 0.0
+
+
 def get_assembly_curve(assembly, number_of_points=360, plot_path=None, save_images=False, normelaize_curve=False,
-                       user_fig=None):
+                       user_fig=None, known_states=None, check_branch=False):
+    """
+    :param known_states: dict step index -> solved state array at that step (see trace_coarse_curve),
+                         set instead of solving
+    :param check_branch: check every step with a TraceMonitor and stop at the first broken one
+    :return: the Curve, or None if check_branch found a broken step
+    """
+    from tqdm import tqdm
     assembly_curve = []
     actuator = assembly.actuator
+    monitor = TraceMonitor(assembly, 360 / number_of_points) if check_branch else None
     for i in tqdm(range(number_of_points)):
         actuator.turn(360 / number_of_points)
-        result = assembly.update_state2()
+        if known_states and i in known_states:
+            assembly.update_cur_state_from_array(known_states[i])
+            result = True
+        else:
+            result = assembly.update_state2()
+        if monitor and not monitor.check(result):
+            solver_stats.record_trace(assembly, len(assembly_curve), number_of_points - len(assembly_curve),
+                                      broken=True)
+            return None
         if result:
             assembly_curve.append(assembly.get_red_point_position())
             if plot_path:
                 assembly.plot_assembly(plot_path=plot_path, image_number=i, save_images=save_images, user_fig=None)
+    solver_stats.record_trace(assembly, len(assembly_curve), number_of_points - len(assembly_curve))
     return Curve(normalize_curve2(assembly_curve) if normelaize_curve else assembly_curve)
 
 
+def trace_coarse_curve(assembly, number_of_points, full_number_of_points):
+    """
+    trace assembly at number_of_points actuator angles, the angles a full_number_of_points trace reaches
+    every full_number_of_points / number_of_points steps (a divisor).
+    the solver lands on the same solutions as the full trace, so the states can be reused by it
+    :return: (points, states) - np array of the traced points and a dict full trace step index -> solved state
+             array for get_assembly_curve(known_states=states), or (None, None) if a solve failed
+    """
+    step = full_number_of_points // number_of_points
+    points, states = [], {}
+    for i in range(number_of_points):
+        assembly.actuator.turn(360 / number_of_points)
+        if not assembly.update_state2():
+            solver_stats.record_trace(assembly, i, number_of_points - i)
+            return None, None
+        points.append(assembly.get_red_point_position())
+        states[(i + 1) * step - 1] = assembly.get_cur_state_array()
+    solver_stats.record_trace(assembly, number_of_points, 0)
+    return np.array(points), states
+
+
 def get_assembly_curve_parallel(assembly, number_of_points=360):
 
     def f(i, orig):
@@ -720,9 +1148,14 @@ def get_assembly_curve_parallel(assembly, number_of_points=360):
         result = orig.update_state2()
         if result:
             return orig.get_red_point_position()
-        return [0, 0, i * (360.0 / number_of_points)]
+        return None
 
+    # points whose solve failed are kept as placeholders, so the curve has number_of_points points
     assembly_curve = [f(i, assembly) for i in range(number_of_points)]
+    dropped = [i for i, point in enumerate(assembly_curve) if point is None]
+    solver_stats.record_trace(assembly, number_of_points - len(dropped), len(dropped))
+    for i in dropped:
+        assembly_curve[i] = [0, 0, i * (360.0 / number_of_points)]
     return Curve(assembly_curve)
 
 
@@ -801,28 +1234,28 @@ def return_prototype():
     return AssemblyA(config)
 
 
-def create_assemblyA(gear_diff_val=1, stick_diff_val=1, position_diff_val=1, second_type=False):
+def create_assemblyA(gear_diff_val=1, stick_diff_val=1, position_diff_val=1, second_type=False, rng=random):
     new_assembly = sample_from_cur_assemblyA(return_prototype3() if second_type else return_prototype2(),
                                              gear_diff_val=gear_diff_val,
                                              stick_diff_val=stick_diff_val, position_diff_val=position_diff_val,
-                                             random_sample=0.8, second_type=second_type)
+                                             random_sample=0.8, second_type=second_type, rng=rng)
     while not is_vaild_assembleA(new_assembly):
         new_assembly = sample_from_cur_assemblyA(return_prototype3() if second_type else return_prototype2(),
                                                  gear_diff_val=gear_diff_val,
                                                  stick_diff_val=stick_diff_val, position_diff_val=position_diff_val,
-                                                 random_sample=0.8, second_type=second_type)
+                                                 random_sample=0.8, second_type=second_type, rng=rng)
     return new_assembly
 
 
-def create_random_assembly_A(gear_diff_val=1, stick_diff_val=1, position_diff_val=1):
+def create_random_assembly_A(gear_diff_val=1, stick_diff_val=1, position_diff_val=1, rng=random):
     new_assembly = sample_from_cur_assemblyA(return_prototype2(), gear_diff_val=gear_diff_val,
                                              stick_diff_val=stick_diff_val, position_diff_val=position_diff_val,
-                                             random_sample=0.8)
+                                             random_sample=0.8, rng=rng)
     while not is_vaild_assembleA(new_assembly):
         # print("not valid assembly")
         new_assembly = sample_from_cur_assemblyA(return_prototype2(), gear_diff_val=gear_diff_val,
                                                  stick_diff_val=stick_diff_val, position_diff_val=position_diff_val,
-                                                 random_sample=0.8)
+                                                 random_sample=0.8, rng=rng)
     return new_assembly
 
 
@@ -830,12 +1263,27 @@ def normalize_curve(curve, anchor):
     return [list(sample - anchor) for sample in curve]
 
 
+def resample_closed_curve(curve_points, number_of_points):
+    """
+    trigonometric interpolation of a closed curve sampled at equally spaced parameters,
+    by zero padding its spectrum
+    :return: np array of shape (number_of_points, dims)
+    """
+    curve_points = np.asarray(curve_points, dtype=np.float64)
+    num_p = len(curve_points)
+    spectrum = np.fft.rfft(curve_points, axis=0)
+    if num_p % 2 == 0:
+        # the nyquist term is split between the positive and negative frequencies
+        spectrum[-1] /= 2
+    padded = np.zeros((number_of_points // 2 + 1, curve_points.shape[1]), dtype=spectrum.dtype)
+    padded[:len(spectrum)] = spectrum
+    return np.fft.irfft(padded, number_of_points, axis=0) * (number_of_points / num_p)
+
+
 def normalize_curve2(curve_points):
     x_com = np.mean(curve_points, axis=0)
     centered = curve_points - x_com
-    pca = PCA(n_components=2)
-    pca.fit(centered)
-    projected_points = pca.transform(centered)
+    _, _, projected_points = pca_2d(centered)
     l_max = np.max(np.abs(projected_points))
     zeros = np.zeros((len(projected_points), 1), dtype=np.float64)
     return np.concatenate([projected_points, zeros], axis=1) / l_max
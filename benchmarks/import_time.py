@@ -0,0 +1,68 @@
+"""
+cold start benchmark of the command line entry points, using python -X importtime
+usage: python benchmarks/import_time.py [--repeat 3] [--top 10] [--json_path results.json]
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENTRY_POINTS = ['generate_db', 'generate_assembly_for_user_curve', 'generate_random_curve_for_learning_A',
+                'db_plotting']
+
+parser = argparse.ArgumentParser(description='measure the import time of every entry point')
+parser.add_argument('--repeat', type=int, default=3, help='runs per entry point, the fastest one is reported')
+parser.add_argument('--top', type=int, default=10, help='number of heaviest imports to list per entry point')
+parser.add_argument('--json_path', type=str, default=None, help='write the results to this json file')
+
+
+def parse_importtime(stderr):
+    """
+    :return: list of (module, self_us, cumulative_us) in the order python reported them
+    """
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, module = line[len('import time:'):].split('|')
+        imports.append((module.strip(), int(self_us), int(cumulative_us)))
+    return imports
+
+
+def repo_modules():
+    return {name[:-3] for name in os.listdir(REPO_DIR) if name.endswith('.py')}
+
+
+def measure(module):
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], cwd=REPO_DIR,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+    if result.returncode != 0:
+        raise RuntimeError(f'importing {module} failed:\n{result.stderr[-2000:]}')
+    return parse_importtime(result.stderr)
+
+
+def main(repeat=3, top=10, json_path=None):
+    results = {}
+    own_modules = repo_modules()
+    for module in ENTRY_POINTS:
+        runs = [measure(module) for _ in range(repeat)]
+        best = min(runs, key=lambda imports: imports[-1][2])
+        # third party top level packages, their cumulative time includes all of their submodules
+        heaviest = sorted((imp for imp in best if '.' not in imp[0] and imp[0] not in own_modules),
+                          key=lambda imp: -imp[2])
+        results[module] = {'total_ms': best[-1][2] / 1000,
+                           'heaviest': [{'module': m, 'cumulative_ms': c / 1000} for m, _, c in heaviest[:top]]}
+        print(f'{module}: {results[module]["total_ms"]:.1f} ms')
+        for imp in results[module]['heaviest']:
+            print(f'    {imp["module"]:<40} {imp["cumulative_ms"]:8.1f} ms')
+    if json_path:
+        with open(json_path, 'w') as f:
+            json.dump(results, f, indent=2)
+    return results
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    main(**vars(args))
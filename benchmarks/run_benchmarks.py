@@ -0,0 +1,315 @@
+"""
+benchmarks of the hot paths: solver steps, curve traces, curve features, normA, polygon intersections,
+closest curve queries and db generation. every case is seeded, so runs are comparable
+usage: python benchmarks/run_benchmarks.py [--cases normA curve] [--repeat 5] [--output results.json]
+                                           [--compare baseline.json] [--threshold 0.2]
+"""
+import os
+import copy
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import subprocess
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from assembly import *
+from sampler import AssemblyA_Sampler
+from config_records import AssemblyRecords, to_records
+from poly_point_isect import isect_polygon
+
+parser = argparse.ArgumentParser(description='run the benchmark cases')
+parser.add_argument('--cases', type=str, nargs='+', default=None, help='cases to run (prefixes), all by default')
+parser.add_argument('--repeat', type=int, default=5, help='runs per case, the fastest one is reported')
+parser.add_argument('--seed', type=int, default=0, help='seed of every case')
+parser.add_argument('--db_sizes', type=int, nargs='+', default=[1000, 10000],
+                    help='sizes of the synthetic dbs of the closest curve cases')
+parser.add_argument('--output', type=str, default=None, help='write the results to this json file')
+parser.add_argument('--compare', type=str, default=None, help='a results json file to compare against')
+parser.add_argument('--threshold', type=float, default=0.2,
+                    help='relative slowdown over the baseline that is reported as a regression')
+
+
+def synthetic_curves(n, number_of_points=72, harmonics=4):
+    """
+    random smooth closed curves in the xy plane, normalized like db curves
+    """
+    t = np.linspace(0, 2 * np.pi, number_of_points, endpoint=False)
+    k = np.arange(1, harmonics + 1)
+    curves = []
+    for _ in range(n):
+        # decaying random fourier coefficients per axis
+        coefficients = np.random.randn(2, 2, harmonics) / k ** 2
+        xy = (coefficients[:, 0] @ np.cos(np.outer(k, t)) + coefficients[:, 1] @ np.sin(np.outer(k, t))).T
+        curves.append(Curve(normalize_curve2(np.column_stack([xy, np.zeros(number_of_points)]))))
+    return curves
+
+
+def solver_steps_case(prototype):
+    def setup():
+        return prototype()
+
+    def run(assembly):
+        for _ in range(72):
+            assembly.actuator.turn(5)
+            assembly.update_state2()
+
+    return setup, run, 72
+
+
+def curve_trace_case(prototype):
+    def setup():
+        return prototype()
+
+    def run(assembly):
+        get_assembly_curve(assembly, number_of_points=72, normelaize_curve=True)
+
+    return setup, run, 1
+
+
+def curve_construction_case():
+    def setup():
+        return get_assembly_curve(return_prototype2(), number_of_points=72).points
+
+    def run(points):
+        for _ in range(100):
+            Curve(points)
+
+    return setup, run, 100
+
+
+def normA_case():
+    def setup():
+        return synthetic_curves(20)
+
+    def run(curves):
+        for c1 in curves:
+            for c2 in curves:
+                Curve.normA(c1, c2)
+
+    return setup, run, 400
+
+
+def isect_polygon_case(size):
+    def setup():
+        # a limacon, one self intersection like a typical traced curve, with a little noise
+        t = np.linspace(0, 2 * np.pi, size, endpoint=False)
+        r = 0.5 + np.cos(t)
+        points = np.column_stack([r * np.cos(t), r * np.sin(t)]) + 1e-3 * np.random.randn(size, 2)
+        return [tuple(p) for p in points]
+
+    def run(points):
+        isect_polygon(points)
+
+    return setup, run, 1
+
+
+def closest_curve_case(db_size, n_candidates=None, exact_index=False):
+    def setup():
+        sample = AssemblyA_Sampler()
+        sample.curve_database = synthetic_curves(db_size)
+        sample.database = [None] * db_size
+        sample.get_curve_index()
+        return sample, synthetic_curves(10)
+
+    def run(setup_result):
+        sample, queries = setup_result
+        for query in queries:
+            if exact_index:
+                sample.get_curve_index().nearest(query, exact=True)
+            else:
+                sample.get_closest_curve(query, n_candidates=n_candidates)
+
+    return setup, run, 10
+
+
+def create_database_case():
+    def setup():
+        return AssemblyA_Sampler()
+
+    def run(sample):
+        sample.create_assemblyA_database(5, num_of_samples_around=3)
+
+    return setup, run, 1
+
+
+# seeded db and candidates of the probe cases, built once per process: (db records, db curves, candidate configs)
+_probe_data = {}
+
+
+def probe_data(seed, db_size=20, samples_around=5):
+    """
+    a db grown by create_assemblyA_database and the valid assemblies sampled around its assemblies,
+    all drawn from random.Random(seed)
+    """
+    if seed not in _probe_data:
+        rng = random.Random(seed)
+        sample = AssemblyA_Sampler(rng=rng)
+        sample.create_assemblyA_database(db_size, num_of_samples_around=3)
+        candidates = []
+        for assembly in sample.database:
+            for _ in range(samples_around):
+                candidate = sample_from_cur_assemblyA(assembly, random_sample=0.5, rng=rng)
+                if is_vaild_assembleA(candidate):
+                    candidates.append(candidate.config)
+        _probe_data[seed] = (to_records(sample.database), list(sample.curve_database), candidates)
+    return _probe_data[seed]
+
+
+def probe_sampler(seed, **kwargs):
+    records, curves, candidates = probe_data(seed)
+    sample = AssemblyA_Sampler(rng=random.Random(seed), **kwargs)
+    sample.database = AssemblyRecords(records)
+    sample.curve_database = list(curves)
+    return sample, candidates
+
+
+def probe_tolerance_case(seed):
+    """
+    the probe decision next to the full trace decision of every candidate, its stats are the false rejections
+    (the probe rejects, the full trace is dissimilar) and the too similar candidates it caught
+    """
+    def setup():
+        return probe_sampler(seed)
+
+    def run(setup_result):
+        sample, candidates = setup_result
+        index = sample.get_curve_index()
+        stats = dict.fromkeys(['candidates', 'too_similar', 'probe_rejected', 'false_rejections'], 0)
+        for config in candidates:
+            curve = get_assembly_curve(AssemblyA(copy.deepcopy(config)), number_of_points=sample.number_of_points,
+                                       normelaize_curve=True, check_branch=True)
+            if not sample.is_full_trace(curve):
+                continue
+            dissimilar = is_dissimilar(curve, index)
+            probe, _ = sample.probe_curve(AssemblyA(copy.deepcopy(config)))
+            rejected = probe is not None and not is_dissimilar(probe, index, gamma=sample.probe_gamma)
+            stats['candidates'] += 1
+            stats['too_similar'] += not dissimilar
+            stats['probe_rejected'] += rejected
+            stats['false_rejections'] += rejected and dissimilar
+        return stats
+
+    return setup, run, 1
+
+
+def sample_around_case(seed, probe):
+    """
+    _sample_around every db assembly with the probe always on (probe_min_similar_rate 0) or off
+    """
+    def setup():
+        if probe:
+            return probe_sampler(seed, probe_min_similar_rate=0)[0]
+        return probe_sampler(seed, probe_points=0)[0]
+
+    def run(sample):
+        accepted = 0
+        for i in range(len(sample.database)):
+            accepted += len(sample._sample_around(sample.database[i], 5))
+        return {'accepted': accepted, 'curves': len(sample.curve_database)}
+
+    return setup, run, 1
+
+
+def get_cases(db_sizes):
+    """
+    :return: dict case name -> (setup, run, number of operations per run).
+             setup() is not timed, run(setup()) is
+    """
+    cases = {'update_state2/prototype2': solver_steps_case(return_prototype2),
+             'update_state2/prototype3': solver_steps_case(return_prototype3),
+             'get_assembly_curve/prototype2': curve_trace_case(return_prototype2),
+             'get_assembly_curve/prototype3': curve_trace_case(return_prototype3),
+             'curve/construction': curve_construction_case(),
+             'curve/normA': normA_case()}
+    for size in (72, 360, 1440):
+        cases[f'isect_polygon/{size}'] = isect_polygon_case(size)
+    for size in db_sizes:
+        cases[f'get_closest_curve/scan/{size}'] = closest_curve_case(size)
+        cases[f'get_closest_curve/index/{size}'] = closest_curve_case(size, n_candidates=32)
+        cases[f'get_closest_curve/exact_index/{size}'] = closest_curve_case(size, exact_index=True)
+    cases['create_assemblyA_database'] = create_database_case()
+    cases['probe/tolerance'] = probe_tolerance_case(0)
+    cases['probe/sample_around/on'] = sample_around_case(0, probe=True)
+    cases['probe/sample_around/off'] = sample_around_case(0, probe=False)
+    return cases
+
+
+def measure(setup, run, number, repeat, seed):
+    """
+    :return: (seconds per operation of every run, what the last run returned)
+    """
+    times, stats = [], None
+    for _ in range(repeat):
+        random.seed(seed)
+        np.random.seed(seed)
+        setup_result = setup()
+        start = time.perf_counter()
+        stats = run(setup_result)
+        times.append((time.perf_counter() - start) / number)
+    return times, stats
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPO_DIR, stdout=subprocess.PIPE,
+                                stderr=subprocess.DEVNULL, universal_newlines=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {'python': platform.python_version(), 'numpy': np.__version__, 'machine': platform.machine(),
+            'processor': platform.processor(), 'commit': commit}
+
+
+def compare(results, baseline, threshold):
+    """
+    :return: names of the cases that got slower than the baseline by more than threshold (relative)
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        ratio = result['best_s'] / baseline[name]['best_s']
+        flag = ''
+        if ratio > 1 + threshold:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print(f'{name:<45} {baseline[name]["best_s"] * 1000:10.3f} ms -> {result["best_s"] * 1000:10.3f} ms'
+              f'  x{ratio:.2f}{flag}')
+    return regressions
+
+
+def main(cases=None, repeat=5, seed=0, db_sizes=(1000, 10000), output=None, compare_path=None, threshold=0.2):
+    results = {}
+    for name, (setup, run, number) in get_cases(db_sizes).items():
+        if cases and not any(name.startswith(prefix) for prefix in cases):
+            continue
+        times, stats = measure(setup, run, number, repeat, seed)
+        results[name] = {'best_s': min(times), 'median_s': float(np.median(times)), 'operations': number,
+                         'repeat': repeat}
+        print(f'{name:<45} {min(times) * 1000:10.3f} ms/op (median {np.median(times) * 1000:.3f})')
+        # counts a case reports about its last run, e.g. the probe decisions
+        if stats:
+            results[name]['stats'] = stats
+            print(f'{"":<45} {stats}')
+    if output:
+        with open(output, 'w') as f:
+            json.dump({'environment': environment(), 'seed': seed, 'results': results}, f, indent=2)
+    if compare_path:
+        with open(compare_path, 'r') as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, threshold)
+        if regressions:
+            print(f'{len(regressions)} regressions: {", ".join(regressions)}')
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    sys.exit(main(cases=args.cases, repeat=args.repeat, seed=args.seed, db_sizes=args.db_sizes, output=args.output,
+                  compare_path=args.compare, threshold=args.threshold))
@@ -0,0 +1,112 @@
+import numpy as np
+from assembly import AssemblyA
+
+# (config key, parameter name) of the scalar fields, followed by the 3 vector fields, in record order
+SCALAR_FIELDS = [("gear1_init_parameters", "radius"), ("stick1_init_parameters", "length"),
+                 ("gear2_init_parameters", "radius"), ("stick2_init_parameters", "length")]
+VECTOR_FIELDS = ["gear1_fixed_position", "gear2_fixed_position",
+                 "gear1_fixed_orientation", "gear2_fixed_orientation",
+                 "gear1_stick1_joint_location", "stick1_gear1_joint_location",
+                 "gear2_stick2_joint_location", "stick2_gear2_joint_location",
+                 "stick1_stick2_joint_location", "stick2_stick1_joint_location"]
+RECORD_SIZE = len(SCALAR_FIELDS) + 3 * len(VECTOR_FIELDS)
+
+
+def config_to_record(config):
+    """
+    :param config: an AssemblyA config dict
+    :return: np array of shape (RECORD_SIZE,)
+    """
+    return np.concatenate([[config[key][name] for key, name in SCALAR_FIELDS]] +
+                          [np.asarray(config[key], dtype=np.float64) for key in VECTOR_FIELDS]).astype(np.float64)
+
+
+def record_to_config(record):
+    """
+    :return: the AssemblyA config dict of record
+    """
+    config = {key: {name: float(value)} for (key, name), value in zip(SCALAR_FIELDS, record)}
+    vectors = np.asarray(record[len(SCALAR_FIELDS):], dtype=np.float64).reshape(len(VECTOR_FIELDS), 3)
+    config.update({key: vector.copy() for key, vector in zip(VECTOR_FIELDS, vectors)})
+    return config
+
+
+def config_from_assembly(assemblyA):
+    """
+    the config of an AssemblyA, read from its components and connections.
+    assemblies sampled before configs were copied share (and mutated) their parents config,
+    the components and connections were built before that, so they are the reliable source
+    """
+    gear1, stick1, gear2, stick2 = assemblyA.components[:4]
+    connections = assemblyA.con_list
+    config = {"gear1_init_parameters": {"radius": gear1.radius}, "stick1_init_parameters": {"length": stick1.length},
+              "gear2_init_parameters": {"radius": gear2.radius}, "stick2_init_parameters": {"length": stick2.length},
+              "gear1_fixed_position": connections[2].fixed_position,
+              "gear2_fixed_position": connections[3].fixed_position,
+              "gear1_fixed_orientation": connections[2].fixed_orientation,
+              "gear2_fixed_orientation": connections[3].fixed_orientation}
+    for con, (key1, key2) in zip(connections[6:9], [("gear1_stick1_joint_location", "stick1_gear1_joint_location"),
+                                                    ("gear2_stick2_joint_location", "stick2_gear2_joint_location"),
+                                                    ("stick1_stick2_joint_location", "stick2_stick1_joint_location")]):
+        config[key1], config[key2] = con.joint1, con.joint2
+    return config
+
+
+class AssemblyRecords:
+    '''
+    list like db of AssemblyA kept as config records.
+    an assembly is built (and solved) from its record the first time it is accessed
+    '''
+
+    def __init__(self, records=()):
+        """
+        :param records: np array of shape (n, RECORD_SIZE)
+        """
+        self._records = [np.asarray(record, dtype=np.float64) for record in records]
+        self._assemblies = {}
+
+    def __len__(self):
+        return len(self._records)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        idx = range(len(self))[idx]
+        if idx not in self._assemblies:
+            self._assemblies[idx] = AssemblyA(record_to_config(self._records[idx]))
+        return self._assemblies[idx]
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def __iadd__(self, assemblies):
+        for assembly in assemblies:
+            self.append(assembly)
+        return self
+
+    def append(self, assembly):
+        self._assemblies[len(self._records)] = assembly
+        self._records.append(config_to_record(config_from_assembly(assembly)))
+
+    def append_record(self, record):
+        self._records.append(np.asarray(record, dtype=np.float64))
+
+    def record(self, idx):
+        return self._records[idx]
+
+    def records(self):
+        """
+        :return: np array of shape (len(self), RECORD_SIZE)
+        """
+        return np.array(self._records, dtype=np.float64).reshape(len(self), RECORD_SIZE)
+
+
+def to_records(database):
+    """
+    :param database: list of AssemblyA or AssemblyRecords
+    :return: np array of shape (len(database), RECORD_SIZE)
+    """
+    if isinstance(database, AssemblyRecords):
+        return database.records()
+    return np.array([config_to_record(config_from_assembly(assembly)) for assembly in database],
+                    dtype=np.float64).reshape(len(database), RECORD_SIZE)
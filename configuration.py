@@ -1,5 +1,4 @@
 import numpy as np
-from scipy.spatial.transform import Rotation
 
 
 class Point:
@@ -41,6 +40,7 @@ class Alignment:
         return np.rad2deg(np.array([self.gamma, self.beta, self.alpha]))
 
     def get_rotation_obj(self):
+        from scipy.spatial.transform import Rotation
         return Rotation.from_euler('xyz', self.vector(), degrees=True)
 
     def __str__(self):
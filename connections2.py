@@ -1,5 +1,4 @@
 from abc import abstractmethod
-from scipy.spatial.transform import Rotation as R
 from component import *
 from configuration import *
 
@@ -10,12 +9,25 @@ class Connection2(ABC):
     """
 
     id_counter = 0
+    PARAM_NAMES = ('x', 'y', 'z', 'gamma', 'beta', 'alpha')
 
     def __init__(self):
         self.params = {}
         self.id = Connection2.id_counter
         Connection2.id_counter += 1
 
+    def get_components(self):
+        """
+        :return: the components whose params the connection constrains, in the order of the params
+        """
+        return []
+
+    def refresh_params(self):
+        """
+        rebuild the params keys from the current ids of the components, after they were renumbered
+        """
+        self.params = {(comp.id, name): 0 for comp in self.get_components() for name in Connection2.PARAM_NAMES}
+
     def get_free_params(self):
         return self.params
 
@@ -25,6 +37,27 @@ class Connection2(ABC):
     def get_id(self):
         return self.id
 
+    def is_planar(self):
+        """
+        :return: True if the connection only involves x, y and alpha of its components
+                 when all of them lie in the xy plane (z = gamma = beta = 0)
+        """
+        return False
+
+    def get_planar_free_params(self):
+        """
+        :return: the free params of the planar model, in the order of the planar constraint arguments
+        """
+        return {p: v for p, v in self.params.items() if p[1] in ('x', 'y', 'alpha')}
+
+    def get_determined_params(self, known):
+        """
+        params whose value this connection determines on its own, so they can be eliminated before solving
+        :param known: the params that are already determined
+        :return: dict param -> function(value) that computes the param, value(param) gives a known param value
+        """
+        return {}
+
     @abstractmethod
     def get_constraint_by_the_book(self):
         pass
@@ -89,7 +122,12 @@ class PinConnection2(Connection2):
         self.params[(self.comp2.id, 'beta')] = 0
         self.params[(self.comp2.id, 'alpha')] = 0
 
+    def get_components(self):
+        return [self.comp1, self.comp2]
+
     def get_constraint_by_the_book(self):
+        from scipy.spatial.transform import Rotation as R
+
         # should get 12 state variables
         def const(x0, y0, z0, c0, b0, a0, x1, y1, z1, c1, b1, a1):
             r0 = R.from_euler('xyz', [c0, b0, a0]).as_matrix()
@@ -103,6 +141,8 @@ class PinConnection2(Connection2):
         return const, self.params
 
     def get_constraint_prime_by_the_book(self):
+        from scipy.spatial.transform import Rotation as R
+
         def const_prime(x0, y0, z0, c0, b0, a0, x1, y1, z1, c1, b1, a1):
             # gradients for X by first component
             r0xy = R.from_euler('xy', [c0, b0]).as_matrix()
@@ -179,6 +219,33 @@ class PinConnection2(Connection2):
 
         return const_prime, self.params
 
+    def is_planar(self):
+        # the pin axes must be along z (and equal), so rotations about z keep them aligned
+        return (self.joint1[2] == 0 and self.joint2[2] == 0 and
+                np.all(self.rotation_axis1[:2] == 0) and np.all(self.rotation_axis2[:2] == 0) and
+                self.rotation_axis1[2] == self.rotation_axis2[2])
+
+    def get_planar_constraint(self):
+        joint1, joint2 = self.joint1[:2], self.joint2[:2]
+
+        # should get 6 state variables
+        def const(x0, y0, a0, x1, y1, a1):
+            c0, s0, c1, s1 = np.cos(a0), np.sin(a0), np.cos(a1), np.sin(a1)
+            return [x0 + c0 * joint1[0] - s0 * joint1[1] - x1 - c1 * joint2[0] + s1 * joint2[1],
+                    y0 + s0 * joint1[0] + c0 * joint1[1] - y1 - s1 * joint2[0] - c1 * joint2[1]]
+
+        return const, self.get_planar_free_params()
+
+    def get_planar_constraint_prime(self):
+        joint1, joint2 = self.joint1[:2], self.joint2[:2]
+
+        def const_prime(x0, y0, a0, x1, y1, a1):
+            c0, s0, c1, s1 = np.cos(a0), np.sin(a0), np.cos(a1), np.sin(a1)
+            return np.array([[1, 0, -s0 * joint1[0] - c0 * joint1[1], -1, 0, s1 * joint2[0] + c1 * joint2[1]],
+                             [0, 1, c0 * joint1[0] - s0 * joint1[1], 0, -1, -c1 * joint2[0] + s1 * joint2[1]]])
+
+        return const_prime, self.get_planar_free_params()
+
 
 # dont use! we dont bind 2 gears together
 class PhaseConnection2(Connection2):
@@ -211,6 +278,9 @@ class PhaseConnection2(Connection2):
             self.params[(self.gear2.id, 'beta')] = 0
             self.params[(self.gear2.id, 'alpha')] = 0
 
+    def get_components(self):
+        return [self.gear1] if self.actuator else [self.gear1, self.gear2]
+
     def get_constraint_by_the_book(self):
         # should get 12 state variables
         def const(x0, y0, z0, c0, b0, a0, x1, y1, z1, c1, b1, a1):
@@ -243,6 +313,43 @@ class PhaseConnection2(Connection2):
         else:
             return const_prime, self.params
 
+    def is_planar(self):
+        return True
+
+    def get_determined_params(self, known):
+        alpha0, r = (self.gear1.id, 'alpha'), self.gear2.radius / self.gear1.radius
+        if self.actuator:
+            return {} if alpha0 in known else {alpha0: lambda value: self.actuator.get_phase()}
+        alpha1 = (self.gear2.id, 'alpha')
+        if alpha1 in known and alpha0 not in known:
+            return {alpha0: lambda value: r * (value(alpha1) + self.phase_diff)}
+        if alpha0 in known and alpha1 not in known:
+            return {alpha1: lambda value: value(alpha0) / r - self.phase_diff}
+        return {}
+
+    def get_planar_free_params(self):
+        return {p: v for p, v in self.params.items() if p[1] == 'alpha'}
+
+    def get_planar_constraint(self):
+        def const(a0, a1):
+            r = self.gear2.radius / self.gear1.radius
+            return [a0 - r * (a1 + self.phase_diff)]
+
+        def const_with_actuator(a0):
+            return [a0 - self.actuator.get_phase()]
+
+        return (const_with_actuator if self.actuator else const), self.get_planar_free_params()
+
+    def get_planar_constraint_prime(self):
+        def const_prime(a0, a1):
+            r = self.gear2.radius / self.gear1.radius
+            return [1, -r]
+
+        def const_prime_with_actuator(a0):
+            return [1]
+
+        return (const_prime_with_actuator if self.actuator else const_prime), self.get_planar_free_params()
+
 
 class FixedConnection2(Connection2):
 
@@ -272,6 +379,9 @@ class FixedConnection2(Connection2):
         self.params[(self.comp.id, 'beta')] = 0
         self.params[(self.comp.id, 'alpha')] = 0
 
+    def get_components(self):
+        return [self.comp]
+
     def get_constraint_by_the_book(self):
         # should get 12 state variables
         def const(x0, y0, z0, c0, b0, a0):
@@ -288,3 +398,27 @@ class FixedConnection2(Connection2):
             return np.eye(6)
 
         return const_prime, self.params
+
+    def get_determined_params(self, known):
+        # values are read when the params are computed, the fixed position may move (see translate_assembly)
+        values = {'x': lambda: self.fixed_position[0], 'y': lambda: self.fixed_position[1],
+                  'z': lambda: self.fixed_position[2], 'gamma': lambda: np.deg2rad(self.fixed_orientation[0]),
+                  'beta': lambda: np.deg2rad(self.fixed_orientation[1]),
+                  'alpha': lambda: np.deg2rad(self.fixed_orientation[2])}
+        return {p: (lambda value, f=values[p[1]]: f()) for p in self.params if p not in known}
+
+    def is_planar(self):
+        return self.fixed_position[2] == 0 and self.fixed_orientation[0] == 0 and self.fixed_orientation[1] == 0
+
+    def get_planar_constraint(self):
+        def const(x0, y0, a0):
+            return [x0 - self.fixed_position[0], y0 - self.fixed_position[1],
+                    a0 - np.deg2rad(self.fixed_orientation[2])]
+
+        return const, self.get_planar_free_params()
+
+    def get_planar_constraint_prime(self):
+        def const_prime(x0, y0, a0):
+            return np.eye(3)
+
+        return const_prime, self.get_planar_free_params()
@@ -0,0 +1,18 @@
+from sampler import AssemblyA_Sampler
+import argparse
+
+parser = argparse.ArgumentParser(description='convert an old dill pickled db to the config records db format')
+
+parser.add_argument('db_path', metavar='db', type=str, help='path of the old db')
+parser.add_argument('output_path', metavar='out', type=str, help='path of the converted db')
+
+
+def main(db_path, output_path):
+    sample = AssemblyA_Sampler.load(db_path)
+    sample.save(output_path)
+    print(f"converted {len(sample.database)} assemblies")
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    main(**vars(args))
@@ -1,10 +1,24 @@
 import json
-import matplotlib.pyplot as plt
 import numpy as np
 import numpy.linalg as alg
 import poly_point_isect
-from shapely.geometry import Polygon
-from sklearn.decomposition import PCA
+
+
+def pca_2d(points):
+    """
+    2 component pca of the points, matching sklearn's PCA(n_components=2) (including its svd sign convention)
+    without importing sklearn on the compute path
+    :param points: np array of shape (n, d)
+    :return: (components, explained_variance, projected_points)
+             components is of shape (2, d), explained_variance of shape (2,), projected_points of shape (n, 2)
+    """
+    centered = points - np.mean(points, axis=0)
+    u, s, vt = alg.svd(centered, full_matrices=False)
+    # make the largest entry of every column of u positive
+    signs = np.sign(u[np.argmax(np.abs(u), axis=0), range(u.shape[1])])
+    components = (vt * signs[:, None])[:2]
+    explained_variance = (s ** 2 / (len(points) - 1))[:2]
+    return components, explained_variance, centered @ components.T
 
 
 class Curve:
@@ -13,6 +27,11 @@ class Curve:
     '''
     # A = np.array([0.1212501165, 0.0005685005, 0, 1.640562057,0, 0.555359019205, 0.051260115736, 0], dtype=np.float64)
     A = np.array([1, 1, 1, 0, 0, 1, 1, 1], dtype=np.float64)
+    # bump when the features, curvature or descriptors definition changes,
+    # stored curves with an older tag are recomputed on first use
+    DESCRIPTOR_VERSION = 2
+    # number of fourier harmonics in the signature, the signature holds 2 values per harmonic
+    SIGNATURE_HARMONICS = 8
 
     def __init__(self, normalized_coordinates):
         self.features = np.zeros((6,), dtype=np.float64)
@@ -24,44 +43,79 @@ class Curve:
 
         self._calculate_features()
         self._calculate_curvature()
+        self._calculate_descriptors()
+
+    @staticmethod
+    def from_features(points, features):
+        """
+        a curve whose features were already computed (e.g. stored in a db file with the same descriptor version),
+        skips the feature computation, the curvature and descriptors are recomputed
+        """
+        curve = Curve.__new__(Curve)
+        curve.points = np.asarray(points, dtype=np.float64)
+        curve.features = np.array(features, dtype=np.float64)
+        curve._calculate_tangents()
+        curve._calculate_curvature()
+        curve._calculate_descriptors()
+        return curve
+
+    @staticmethod
+    def descriptor_tag():
+        """
+        :return: a tag identifying the feature definition and the weights of A
+                 that the stored descriptors were computed with
+        """
+        return Curve.DESCRIPTOR_VERSION, Curve.A.tobytes()
+
+    def refresh_descriptors(self, force=False):
+        """
+        recompute features, curvature and descriptors if they were computed with an older tag
+        (old pickled curves don't have a tag at all)
+        :return: True if the curve was recomputed
+        """
+        if not force and getattr(self, '_descriptor_tag', None) == Curve.descriptor_tag():
+            return False
+        self.features = np.zeros((6,), dtype=np.float64)
+        self._calculate_features()
+        self._calculate_curvature()
+        self._calculate_descriptors()
+        return True
 
     def plot_curve(self, custom_fig=None):
         if custom_fig is not None:
             fig, ax = custom_fig
         else:
+            import matplotlib.pyplot as plt
             fig, ax = plt.subplots()
-        curve = Polygon(self.points)
-        x, y = curve.exterior.xy
-        ax.plot(x, y)
+        # closed ring, like the exterior of a polygon of the points
+        ring = np.concatenate([self.points, self.points[:1]])
+        ax.plot(ring[:, 0], ring[:, 1])
         return (fig, ax)
 
-    def _calculate_features(self):
-        n = len(self.points)
-        self._e = np.zeros(self.points.shape, dtype=np.float64)
-        for i in range(n):
-            self._e[i] = self.points[i] - self.points[(i - 1 + n) % n]
+    def _calculate_tangents(self):
+        # e_i = p_i - p_(i-1), cyclic
+        self._e = self.points - np.roll(self.points, 1, axis=0)
+        self._t = self._e / alg.norm(self._e, axis=1)[:, None]
 
-        self._t = np.zeros(self.points.shape, dtype=np.float64)
-        for i in range(n):
-            self._t[i] = self._e[i] / alg.norm(self._e[i])
+    def _calculate_features(self):
+        self._calculate_tangents()
+        previous_points = np.roll(self.points, 1, axis=0)
+        e_norms = alg.norm(self._e, axis=1)
 
         x_com = np.mean(self.points, axis=0)
 
         # f0 - length of curve
-        self.features[0] = np.sum(np.array([alg.norm(_e) for _e in self._e]))
+        self.features[0] = np.sum(e_norms)
 
         # f1 - surface area between anchor and curve
-        f1 = 0
-        for i in range(n):
-            f1 += np.linalg.norm(np.cross(self.points[i], self.points[(i - 1 + n) % n]))
-        self.features[1] = f1
+        self.features[1] = np.sum(alg.norm(np.cross(self.points, previous_points).reshape(len(self.points), -1),
+                                           axis=1))
 
         # f2 - calculate l_min/l_max using PCA
-        pca = PCA(n_components=2)
-        pca.fit(self.points)
-        v_max = pca.components_[0]
-        l_max = pca.explained_variance_[0]
-        l_min = pca.explained_variance_[1]
+        components, explained_variance, projected_points = pca_2d(self.points)
+        v_max = components[0]
+        l_max = explained_variance[0]
+        l_min = explained_variance[1]
         self.features[2] = l_min / l_max
 
         # f3 - distance from anchor
@@ -71,53 +125,107 @@ class Curve:
         self.features[4] = np.arcsin(alg.norm(np.cross(x_com / alg.norm(x_com), v_max)))
 
         # f5 - count intersections in the projected 2d curve
-        projected_points = pca.transform(self.points)
         self.features[5] = len(poly_point_isect.isect_polygon(projected_points))
 
     def _calculate_curvature(self):
-        self._curvature = np.zeros(self.points.shape)
+        previous_t = np.roll(self._t, 1, axis=0)
+        # 2d curves give a scalar cross product per point, spread it over the coordinates
+        cross = np.cross(previous_t, self._t).reshape(len(self._t), -1) * np.ones(self._t.shape)
+        self._curvature = (2 / (1 + np.sum(self._t * previous_t, axis=1)))[:, None] * cross
+
+    def _calculate_descriptors(self):
+        """
+        reusable per-curve values for normA, computed once and stored with the curve (and so with the db)
+        """
+        # squared norms and spectra for the cyclic shift search of f7 and f8
+        self._points_sq_norm = np.sum(self.points * self.points)
+        self._curvature_sq_norm = np.sum(self._curvature * self._curvature)
+        self._points_fft = np.fft.rfft(self.points, axis=0)
+        self._curvature_fft = np.fft.rfft(self._curvature, axis=0)
+        # features scaled by sqrt(A), so the features part of normA is a plain euclidean distance
+        self._weighted_features = self.features * np.sqrt(Curve.A[:6])
+        self.signature = self._calculate_signature()
+        self._descriptor_tag = Curve.descriptor_tag()
+
+    def _calculate_signature(self):
+        """
+        compact signature that doesn't depend on the start point, rotation or reflection of the curve,
+        so also not on the sign ambiguity left by the pca normalization.
+        it holds the A-weighted features and, for every harmonic k, (|Z_k| + |Z_-k|) / sqrt(2) and
+        ||Z_k| - |Z_-k|| / sqrt(2), where Z is the spectrum of the complex contour z = x + iy
+        (a shift or rotation changes only phases, a reflection swaps k and -k).
+        by parseval the signature distance between two curves is never larger than their normA
+        :return: np array of shape (6 + 2 * SIGNATURE_HARMONICS,)
+        """
         num_p = len(self.points)
-        for i in range(num_p):
-            tj_1 = self._t[(i - 1 + num_p) % num_p]
-            tj = self._t[i]
-            cross = np.cross(tj_1, tj)
-            self._curvature[i] = ((2 / (1 + np.dot(tj, tj_1))) * cross)
+        z = self.points[:, 0] + 1j * self.points[:, 1]
+        spectrum = np.abs(np.fft.fft(z)) / num_p
+        k = np.arange(1, Curve.SIGNATURE_HARMONICS + 1)
+        positive, negative = spectrum[k % num_p], spectrum[-k % num_p]
+        harmonics = np.concatenate([positive + negative, np.abs(positive - negative)]) * np.sqrt(Curve.A[6] / 2)
+        return np.concatenate([self._weighted_features, harmonics])
 
     @staticmethod
-    def normA(curve1, curve2):
-        really_big_number = 999999999.0
+    def _min_cyclic_sq_distance(a_fft, a_sq_norm, b_fft, b_sq_norm, num_p):
+        """
+        min over l of sum_k ||a[k] - b[(k + l) % num_p]||^2, using
+        ||a - roll(b)||^2 = ||a||^2 + ||b||^2 - 2 * corr(a, b)[l] and an fft cross correlation
+        """
+        correlation = np.fft.irfft(np.sum(np.conj(a_fft) * b_fft, axis=1), num_p)
+        return max(a_sq_norm + b_sq_norm - 2 * np.max(correlation), 0.0)
+
+    @staticmethod
+    def _shift_distances(curve1, curve2):
+        """
+        :return: (f7, f8) - the distance between the curves and between their discrete curvatures,
+                 both minimized over cyclic shifts of the start point
+        """
+        curve1.refresh_descriptors()
+        curve2.refresh_descriptors()
+        num_p = len(curve1.points)
+        if len(curve2.points) == num_p:
+            cj_fft, cj_sq_norm = curve2._points_fft, curve2._points_sq_norm
+            kj_fft, kj_sq_norm = curve2._curvature_fft, curve2._curvature_sq_norm
+        else:
+            # only the first num_p samples of curve2 take part in the comparison
+            cj, kj = curve2.points[:num_p], curve2._curvature[:num_p]
+            cj_fft, cj_sq_norm = np.fft.rfft(cj, axis=0), np.sum(cj * cj)
+            kj_fft, kj_sq_norm = np.fft.rfft(kj, axis=0), np.sum(kj * kj)
+
         # calculate feature 7 - distance between curves
-        f7 = really_big_number
-        ci = curve1.points
-        cj = curve2.points
-        num_p = len(ci)
-        for l in range(num_p):
-            distance = 0
-            for k in range(num_p):
-                norm = np.linalg.norm(ci[k] - cj[(k + l) % num_p])
-                distance = distance + norm * norm
-
-            if distance < f7:
-                f7 = distance
+        f7 = Curve._min_cyclic_sq_distance(curve1._points_fft, curve1._points_sq_norm, cj_fft, cj_sq_norm, num_p)
         f7 = np.sqrt(f7 / num_p)
 
         # calculate feature 8 - discrete curvature distance
-        f8 = really_big_number
-        ki = curve1._curvature
-        kj = curve2._curvature
-        num_p = len(ci)
-        for l in range(num_p):
-            distance = 0
-            for k in range(num_p):
-                norm = np.linalg.norm(ki[k] - kj[(k + l) % num_p])
-                distance = distance + norm * norm
-
-            if distance < f8:
-                f8 = distance
+        f8 = Curve._min_cyclic_sq_distance(curve1._curvature_fft, curve1._curvature_sq_norm, kj_fft, kj_sq_norm,
+                                           num_p)
         f8 = np.sqrt(f8)
+        return f7, f8
 
-        features_difference = np.concatenate((curve1.features - curve2.features, np.array([f7, f8])))
-        return np.sqrt(np.dot(features_difference * Curve.A, features_difference))
+    @staticmethod
+    def feature_difference(curve1, curve2):
+        """
+        :return: the unweighted difference vector that normA weights by A:
+                 the 6 feature deltas followed by f7 and f8, np array of shape (8,)
+        """
+        f7, f8 = Curve._shift_distances(curve1, curve2)
+        return np.concatenate((curve1.features - curve2.features, np.array([f7, f8])))
+
+    @staticmethod
+    def weighted_norm(features_difference, A=None):
+        """
+        :param features_difference: difference vectors of shape (..., 8), as returned by feature_difference
+        :param A: weights to use instead of Curve.A
+        :return: the normA of every difference vector, of shape (...)
+        """
+        A = Curve.A if A is None else A
+        return np.sqrt(np.einsum('...k,k,...k->...', features_difference, A, features_difference))
+
+    @staticmethod
+    def normA(curve1, curve2):
+        f7, f8 = Curve._shift_distances(curve1, curve2)
+        features_distance = curve1._weighted_features - curve2._weighted_features
+        return np.sqrt(np.dot(features_distance, features_distance) + Curve.A[6] * f7 * f7 + Curve.A[7] * f8 * f8)
 
     def to_json(self):
         c = {}
@@ -126,6 +234,7 @@ class Curve:
         return json.dumps(c)
 
     def plot(self, path=r"C:\Users\A\Desktop\temp", save_image=False):
+        import matplotlib.pyplot as plt
         # evenly sampled time at 200ms intervals
         xs = [i[0] for i in self.points]
         ys = [i[1] for i in self.points]
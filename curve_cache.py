@@ -0,0 +1,84 @@
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import numpy as np
+
+# bump when the way cached curves are traced changes, old entries then simply stop matching
+CACHE_VERSION = 1
+
+
+def _canonical(value):
+    if isinstance(value, dict):
+        return {str(k): _canonical(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [_canonical(v) for v in value]
+    if isinstance(value, (float, np.floating, int, np.integer)):
+        return round(float(value), 9)
+    return value
+
+
+def curve_key(config, figure=None, number_of_points=360):
+    """
+    content address of a traced curve
+    :param config: the AssemblyA config dict
+    :param figure: name of the figure driven by the assembly ('man', 'snake') or None
+    :param number_of_points: sampling resolution of the trace
+    :return: hex digest
+    """
+    content = {'version': CACHE_VERSION, 'config': _canonical(config), 'figure': figure,
+               'number_of_points': number_of_points}
+    return hashlib.sha1(json.dumps(content, sort_keys=True).encode()).hexdigest()
+
+
+class CurveCache:
+    '''
+    content addressed cache of curve points, stored as raw float64 arrays in a single indexed sqlite file.
+    least recently used entries are evicted past max_bytes. sqlite handles the locking, so the same file
+    can be shared by the plotting cli and a server process, and an instance can be shared by threads
+    '''
+
+    def __init__(self, path='curve_cache.sqlite', max_bytes=256 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._connection:
+            self._connection.execute('CREATE TABLE IF NOT EXISTS curves (key TEXT PRIMARY KEY, rows INTEGER, '
+                                     'cols INTEGER, data BLOB, last_used REAL)')
+            self._connection.execute('CREATE INDEX IF NOT EXISTS curves_last_used ON curves (last_used)')
+
+    def get(self, key):
+        """
+        :return: the cached points as an np array of shape (rows, cols), or None
+        """
+        with self._lock, self._connection:
+            row = self._connection.execute('SELECT rows, cols, data FROM curves WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            self._connection.execute('UPDATE curves SET last_used = ? WHERE key = ?', (time.time(), key))
+        rows, cols, data = row
+        return np.frombuffer(data, dtype=np.float64).reshape(rows, cols).copy()
+
+    def put(self, key, points):
+        points = np.ascontiguousarray(points, dtype=np.float64)
+        with self._lock, self._connection:
+            self._connection.execute('INSERT OR REPLACE INTO curves VALUES (?, ?, ?, ?, ?)',
+                                     (key, points.shape[0], points.shape[1], points.tobytes(), time.time()))
+            self._evict()
+
+    def _evict(self):
+        total, = self._connection.execute('SELECT COALESCE(SUM(LENGTH(data)), 0) FROM curves').fetchone()
+        for key, size in self._connection.execute('SELECT key, LENGTH(data) FROM curves ORDER BY last_used').fetchall():
+            if total <= self.max_bytes:
+                break
+            self._connection.execute('DELETE FROM curves WHERE key = ?', (key,))
+            total -= size
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute('SELECT COUNT(*) FROM curves').fetchone()[0]
+
+    def close(self):
+        self._connection.close()
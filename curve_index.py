@@ -0,0 +1,136 @@
+import numpy as np
+from curve import Curve
+
+
+class CurveIndex:
+    '''
+    an index over a list of curves by their invariant signatures.
+    used as an approximate nearest neighbor prefilter, the candidates are then re-ranked by the exact normA,
+    and as an incremental index for "is there a curve within gamma" checks while sampling
+    '''
+
+    def __init__(self, curves=(), n_candidates=32, eps=0.0):
+        """
+        :param curves: initial curves to index
+        :param n_candidates: how many signature neighbors are re-ranked by normA,
+                             higher means better recall and slower queries
+        :param eps: approximation factor of the kd-tree search, 0 is exact signature search
+        """
+        self.n_candidates = n_candidates
+        self.eps = eps
+        self.curves = []
+        # preallocated buffers that grow by doubling, only the first len(self.curves) rows are valid
+        self._signature_buffer = np.zeros((16, 6 + 2 * Curve.SIGNATURE_HARMONICS), dtype=np.float64)
+        self._curvature_norm_buffer = np.zeros((16,), dtype=np.float64)
+        self._tree = None
+        self.extend(curves)
+
+    def __len__(self):
+        return len(self.curves)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_tree'] = None
+        return state
+
+    @property
+    def _signatures(self):
+        return self._signature_buffer[:len(self.curves)]
+
+    @property
+    def _curvature_norms(self):
+        return self._curvature_norm_buffer[:len(self.curves)]
+
+    def add(self, curve):
+        self.extend([curve])
+
+    def extend(self, curves):
+        curves = list(curves)
+        if not curves:
+            return
+        n, new_n = len(self.curves), len(self.curves) + len(curves)
+        if new_n > len(self._signature_buffer):
+            capacity = max(new_n, 2 * len(self._signature_buffer))
+            self._signature_buffer = np.resize(self._signature_buffer, (capacity, self._signature_buffer.shape[1]))
+            self._curvature_norm_buffer = np.resize(self._curvature_norm_buffer, (capacity,))
+        for i, curve in enumerate(curves):
+            curve.refresh_descriptors()
+            self._signature_buffer[n + i] = curve.signature
+            self._curvature_norm_buffer[n + i] = np.sqrt(curve._curvature_sq_norm)
+        self.curves += curves
+        self._tree = None
+
+    def sync(self, curve_database):
+        """
+        index the curves that were appended to curve_database since the last sync
+        """
+        if len(curve_database) < len(self.curves):
+            raise ValueError("curve database shrank, the index has to be rebuilt")
+        self.extend(curve_database[len(self.curves):])
+
+    def _get_tree(self):
+        if self._tree is None:
+            from scipy.spatial import cKDTree
+            self._tree = cKDTree(self._signatures)
+        return self._tree
+
+    def lower_bounds(self, curve):
+        """
+        cheap lower bounds of normA between curve and every indexed curve:
+        the signature distance bounds the features and f7 terms, and | ||k_i|| - ||k_j|| | bounds f8
+        :return: np array of shape (len(self),)
+        """
+        curve.refresh_descriptors()
+        signature_diff = self._signatures - curve.signature
+        curvature_diff = self._curvature_norms - np.sqrt(curve._curvature_sq_norm)
+        return np.sqrt(np.sum(signature_diff * signature_diff, axis=1) + Curve.A[7] * curvature_diff * curvature_diff)
+
+    def any_within(self, curve, gamma):
+        """
+        :return: True if some indexed curve has normA(curve, indexed curve) < gamma.
+                 only curves whose lower bound is below gamma are compared, closest bound first,
+                 and the scan stops at the first hit
+        """
+        if not self.curves:
+            return False
+        bounds = self.lower_bounds(curve)
+        candidates = np.flatnonzero(bounds < gamma)
+        for i in candidates[np.argsort(bounds[candidates])]:
+            if Curve.normA(curve, self.curves[i]) < gamma:
+                return True
+        return False
+
+    def candidates(self, curve, n_candidates=None, eps=None):
+        """
+        :return: indices of the curves closest to curve by signature, nearest first
+        """
+        n_candidates = n_candidates or self.n_candidates
+        eps = self.eps if eps is None else eps
+        curve.refresh_descriptors()
+        if n_candidates >= len(self.curves):
+            return np.argsort(np.linalg.norm(self._signatures - curve.signature, axis=1))
+        _, idx = self._get_tree().query(curve.signature, k=n_candidates, eps=eps)
+        return np.atleast_1d(idx)
+
+    def nearest(self, curve, k=1, n_candidates=None, eps=None, exact=False):
+        """
+        :param curve: query curve
+        :param k: number of results
+        :param exact: scan by increasing lower bound until it exceeds the k-th best normA,
+                      so the result is the same as a full scan
+        :return: list of (normA distance, index) of the k closest candidates, sorted by distance
+        """
+        if not self.curves:
+            return []
+        if exact:
+            bounds = self.lower_bounds(curve)
+            distances = []
+            for i in np.argsort(bounds):
+                if len(distances) == k and bounds[i] >= distances[-1][0]:
+                    break
+                distances = sorted(distances + [(Curve.normA(curve, self.curves[i]), int(i))])[:k]
+            return distances
+        n_candidates = max(k, n_candidates or self.n_candidates)
+        idx = self.candidates(curve, n_candidates=n_candidates, eps=eps)
+        distances = sorted((Curve.normA(curve, self.curves[i]), int(i)) for i in idx)
+        return distances[:k]
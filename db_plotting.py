@@ -5,19 +5,28 @@ parser = argparse.ArgumentParser()
 
 parser.add_argument('db_path', metavar='db', type=str,
                     help='sampler (db) destination path')
-parser.add_argument('--curve_idx', metavar='i', type=int,
+parser.add_argument('--curve_idx', metavar='i', type=int, nargs='+',
                     help='''
-                    index of the desired curve to plot from the db
+                    index (or indices) of the desired curve to plot from the db
                     if not specified than all the curves are saved to '/db' folder''')
+parser.add_argument('--workers', metavar='w', type=int, default=1,
+                    help='number of processes used to plot all the curves or animate several indices')
+parser.add_argument('--format', metavar='f', type=str, default='gif', choices=['gif', 'webp', 'mp4'],
+                    help='animation format')
+parser.add_argument('--incremental', action='store_true',
+                    help='when plotting all the curves, only plot the ones without an image yet')
 
 
-def main(db_path, curve_idx=None):
-    with open(db_path, 'rb') as input_file:
-        db_sampler = dill.load(input_file)
+def main(db_path, curve_idx=None, workers=1, incremental=False, format='gif'):
+    if isinstance(curve_idx, list) and len(curve_idx) > 1:
+        from rendering import render_animations
+        render_animations(db_path, curve_idx, format=format, workers=workers)
+        return
+    db_sampler = AssemblyA_Sampler.load(db_path)
     if curve_idx is None:
-        db_sampler.plot_all_db()
+        db_sampler.plot_all_db(workers=workers, incremental=incremental)
     else:
-        db_sampler.plot_with_figure(curve_idx)
+        db_sampler.plot_with_figure(curve_idx[0] if isinstance(curve_idx, list) else curve_idx, format=format)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,150 @@
+import heapq
+import random
+from abc import ABC, abstractmethod
+from collections import deque
+
+
+class Frontier(ABC):
+    '''
+    the assemblies create_assemblyA_database still has to sample around, kept as config records
+    (see config_records) so a large frontier doesn't hold solved assemblies.
+    at most max_size records are kept, subclasses decide the exploration order and what is dropped when full
+    '''
+    # whether push needs the novelty of the records
+    uses_novelty = False
+
+    def __init__(self, max_size=10000, rng=random):
+        self.max_size = max_size
+        self.rng = rng
+        # records that did not fit
+        self.dropped = 0
+
+    @abstractmethod
+    def __len__(self):
+        pass
+
+    @abstractmethod
+    def push(self, record, novelty=0.0):
+        """
+        :param novelty: normA distance of the assembly curve to the closest db curve when it was accepted
+        """
+        pass
+
+    @abstractmethod
+    def pop(self):
+        """
+        :return: the next record to sample around
+        """
+        pass
+
+
+class BFSFrontier(Frontier):
+    '''
+    oldest record first. new records are dropped when full
+    '''
+
+    def __init__(self, max_size=10000, rng=random):
+        super().__init__(max_size, rng)
+        self._queue = deque()
+
+    def __len__(self):
+        return len(self._queue)
+
+    def push(self, record, novelty=0.0):
+        if len(self._queue) >= self.max_size:
+            self.dropped += 1
+            return
+        self._queue.append(record)
+
+    def pop(self):
+        return self._queue.popleft()
+
+
+class NoveltyFrontier(Frontier):
+    '''
+    most novel record first, the newest one among equals. the least novel record (the oldest among equals) is
+    dropped when full. a max heap serves pop and a min heap the drops, both O(log n), entries removed through
+    the other heap are skipped when they surface
+    '''
+    uses_novelty = True
+
+    def __init__(self, max_size=10000, rng=random):
+        super().__init__(max_size, rng)
+        # push counter -> record of the kept records
+        self._records = {}
+        # (-novelty, -push counter) and (novelty, push counter) of the kept records, and of removed ones
+        self._max_heap = []
+        self._min_heap = []
+        self._counter = 0
+
+    def __len__(self):
+        return len(self._records)
+
+    def push(self, record, novelty=0.0):
+        self._records[self._counter] = record
+        heapq.heappush(self._max_heap, (-novelty, -self._counter))
+        heapq.heappush(self._min_heap, (novelty, self._counter))
+        self._counter += 1
+        if len(self._records) > self.max_size:
+            del self._records[self._pop_kept(self._min_heap, 1)]
+            self.dropped += 1
+        self._compact()
+
+    def pop(self):
+        return self._records.pop(self._pop_kept(self._max_heap, -1))
+
+    def _pop_kept(self, heap, sign):
+        """
+        :return: the push counter of the first kept record of heap, whose entries hold sign * counter
+        """
+        while True:
+            counter = sign * heapq.heappop(heap)[1]
+            if counter in self._records:
+                return counter
+
+    def _compact(self):
+        # drop the removed entries once they are the majority, so the heaps stay O(max_size)
+        for heap in (self._max_heap, self._min_heap):
+            if len(heap) > 2 * len(self._records) + 16:
+                heap[:] = [entry for entry in heap if abs(entry[1]) in self._records]
+                heapq.heapify(heap)
+
+
+class RandomFrontier(Frontier):
+    '''
+    uniformly random record. a random record is replaced when full
+    '''
+
+    def __init__(self, max_size=10000, rng=random):
+        super().__init__(max_size, rng)
+        self._records = []
+
+    def __len__(self):
+        return len(self._records)
+
+    def push(self, record, novelty=0.0):
+        if len(self._records) >= self.max_size:
+            self._records[self.rng.randrange(len(self._records))] = record
+            self.dropped += 1
+            return
+        self._records.append(record)
+
+    def pop(self):
+        # swap with the last record, so the pop is O(1)
+        i = self.rng.randrange(len(self._records))
+        self._records[i], self._records[-1] = self._records[-1], self._records[i]
+        return self._records.pop()
+
+
+STRATEGIES = {'bfs': BFSFrontier, 'novelty': NoveltyFrontier, 'random': RandomFrontier}
+
+
+def make_frontier(strategy='bfs', max_size=10000, rng=random):
+    """
+    :param strategy: a name in STRATEGIES or a Frontier instance, which is returned as is
+    """
+    if isinstance(strategy, Frontier):
+        return strategy
+    if strategy not in STRATEGIES:
+        raise ValueError(f"unknown frontier strategy {strategy}, expected one of {', '.join(STRATEGIES)}")
+    return STRATEGIES[strategy](max_size=max_size, rng=rng)
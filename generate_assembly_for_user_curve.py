@@ -1,7 +1,9 @@
 import json
 import argparse
-import dill
 from curve import Curve
+from query_server import match_curve, QueryServer
+from sampler import AssemblyA_Sampler
+from sharded_db import ShardedDatabase
 
 
 def read_input_as_curve(json_path):
@@ -16,21 +18,30 @@ def read_input_as_curve(json_path):
 parser = argparse.ArgumentParser(
     description='Gets a user defined curve as a points list and searching the DB for closest representing curve')
 parser.add_argument('-json_path', help='a path to the file containing a json formatted points list')
-parser.add_argument('-db_path', help='a path to the db file')
+parser.add_argument('-db_path', help='a path to the db file, or to a sharded db directory')
+parser.add_argument('-candidates', type=int, default=None,
+                    help='only re-rank this many db curves with the closest signatures (faster, approximate)')
+parser.add_argument('-serve', choices=['stdin', 'tcp'], default=None,
+                    help='keep running and answer json line requests from stdin or a localhost socket')
+parser.add_argument('-port', type=int, default=5005, help='port of the tcp server')
+parser.add_argument('-workers', type=int, default=4, help='concurrent requests in stdin server mode')
 
 if __name__ == "__main__":
     # arguments parser
     args = parser.parse_args()
 
-    # handle input
-    curve = read_input_as_curve(args.json_path)
-
-    input_file = open(args.db_path, 'rb')
-    sample = dill.load(input_file)
-
-    db_closest_curve, assembly, db_curve = sample.get_closest_curve(curve, get_all_dis=True)
-
-    c = {}
-    c['curve'] = {'points': db_closest_curve.points.tolist(), 'features': db_closest_curve.features.tolist()}
-    c['assembly'] = {'components': assembly.describe_assembly()}
-    print(json.dumps(c))
+    if ShardedDatabase.is_sharded(args.db_path):
+        sample = ShardedDatabase(args.db_path)
+    else:
+        sample = AssemblyA_Sampler.load(args.db_path)
+
+    if args.serve:
+        server = QueryServer(sample, n_candidates=args.candidates, workers=args.workers)
+        if args.serve == 'stdin':
+            server.serve_stdin()
+        else:
+            server.serve_tcp(port=args.port)
+    else:
+        # handle input
+        curve = read_input_as_curve(args.json_path)
+        print(json.dumps(match_curve(sample, curve, n_candidates=args.candidates)))
@@ -1,5 +1,7 @@
 from sampler import AssemblyA_Sampler
+import time
 import argparse
+import solver_stats
 from os.path import join as pjoin
 
 parser = argparse.ArgumentParser()
@@ -12,18 +14,43 @@ parser.add_argument('--load_db', metavar='l', type=bool, default=False,
                     help='load current sampler from specified path, new samples will be added to it')
 parser.add_argument('--debug_mode', metavar='d', type=bool, default=False,
                     help='debug mode')
+parser.add_argument('--seed', metavar='s', type=int, default=None,
+                    help='master seed, runs with the same seed and number of workers generate the same db')
+parser.add_argument('--workers', metavar='w', type=int, default=1,
+                    help='number of generating processes, each one draws from its own random stream')
+parser.add_argument('--strategy', metavar='e', type=str, default='bfs', choices=['bfs', 'novelty', 'random'],
+                    help='order the sampler explores accepted assemblies in, novelty: farthest curve from the db first')
+parser.add_argument('--adaptive', action='store_true',
+                    help='learn which parameters to mutate and how far from the outcomes of the samples')
+parser.add_argument('--solver_stats', metavar='p', dest='solver_stats_path', type=str, default=None,
+                    help='write the solver counters to this path, .json or prometheus text (.prom)')
 
 
-def main(n, file_path=pjoin("dbs", "new_db"), load_db=False, debug_mode=False):
+def main(n, file_path=pjoin("dbs", "new_db"), load_db=False, debug_mode=False, seed=None, workers=1,
+         strategy='bfs', adaptive=False, solver_stats_path=None):
     print(n)
+    if solver_stats_path:
+        solver_stats.enable()
     if load_db:
         sample = AssemblyA_Sampler.load(file_path)
     else:
         sample = AssemblyA_Sampler()
+    start_size = len(sample.database)
+    start_time = time.perf_counter()
 
-    sample.create_assemblyA_database((3 * n) // 4, num_of_samples_around=10, debug_mode=debug_mode, second_type=False)
-    sample.create_assemblyA_database(n // 4, num_of_samples_around=10, debug_mode=debug_mode, second_type=True)
+    if seed is None and workers == 1:
+        sample.create_mixed_database(n, debug_mode=debug_mode, strategy=strategy, adaptive=adaptive)
+    else:
+        sample.create_database_parallel(n, seed=seed, workers=workers, debug_mode=debug_mode, strategy=strategy,
+                                        adaptive=adaptive)
+    elapsed = time.perf_counter() - start_time
+    print(f"added {len(sample.database) - start_size} assemblies in {elapsed:.1f} s, "
+          f"{(len(sample.database) - start_size) / elapsed:.2f} accepted/s")
     sample.save(file_path)
+    if solver_stats_path:
+        with open(solver_stats_path, 'w') as stats_file:
+            stats = solver_stats.global_stats
+            stats_file.write(stats.to_json() if solver_stats_path.endswith('.json') else stats.to_prometheus())
 
 
 if __name__ == "__main__":
@@ -1,26 +1,111 @@
 from assembly import *
 from curve import Curve
+from multiprocessing import Pool
 import argparse
+import json
+import random
+import sys
+
 
 def normalize_curve(curve, anchor):
     return ([list(sample - anchor) for sample in curve.points])
 
 
-def generate_random_curve(number_of_points=360, gear_diff_val=1, stick_diff_val=1, position_diff_val=1):
+def random_curve(number_of_points=360, gear_diff_val=1, stick_diff_val=1, position_diff_val=1, rng=random):
     random_assembly_a = create_assemblyA(gear_diff_val=gear_diff_val, stick_diff_val=stick_diff_val, \
-                                         position_diff_val=position_diff_val)
+                                         position_diff_val=position_diff_val, rng=rng)
     assembly_curve = get_assembly_curve_parallel(random_assembly_a, number_of_points=number_of_points)
 
     assembly_curve = normalize_curve2(assembly_curve.points)
 
-    c = Curve(assembly_curve)
+    return Curve(assembly_curve)
+
+
+def generate_random_curve(number_of_points=360, gear_diff_val=1, stick_diff_val=1, position_diff_val=1):
+    c = random_curve(number_of_points=number_of_points, gear_diff_val=gear_diff_val, stick_diff_val=stick_diff_val,
+                     position_diff_val=position_diff_val)
     # output curve to stdout for the C# to read
     print(c.to_json())
 
 
+def generate_batch(batch_args):
+    """
+    generate one batch of random curves, the batch has its own random stream seeded by its index so the output
+    doesn't depend on the number of workers
+    :param batch_args: (seed, batch_index, batch_size, curve_kwargs)
+    :return: (points of shape (batch_size, number_of_points, 3), features of shape (batch_size, 6))
+    """
+    seed, batch_index, batch_size, curve_kwargs = batch_args
+    rng = random.Random(f'{seed}-{batch_index}')
+    curves = [random_curve(rng=rng, **curve_kwargs) for _ in range(batch_size)]
+    return np.array([c.points for c in curves]), np.array([c.features for c in curves])
+
+
+def stream_random_curves(n, seed=0, workers=1, batch_size=16, **curve_kwargs):
+    """
+    generate n random curves in batches, over a pool of workers so imports and startup are paid once per worker
+    :return: generator of (points, features) batches, in order
+    """
+    number_of_batches = (n + batch_size - 1) // batch_size
+    batches = [(seed, i, min(batch_size, n - i * batch_size), curve_kwargs) for i in range(number_of_batches)]
+    if workers <= 1:
+        for batch in batches:
+            yield generate_batch(batch)
+        return
+    with Pool(workers) as pool:
+        for points, features in pool.imap(generate_batch, batches):
+            yield points, features
+
+
+def write_json_lines(batches, output_stream):
+    for points, features in batches:
+        for curve_points, curve_features in zip(points, features):
+            output_stream.write(json.dumps({'points': curve_points.tolist(), 'features': curve_features.tolist()}))
+            output_stream.write('\n')
+        output_stream.flush()
+
+
+def write_arrays(batches, path, n, number_of_points):
+    """
+    write the curves points to a .npy array of shape (n, number_of_points, 3) and their features
+    next to it, to <path without .npy>_features.npy of shape (n, 6)
+    """
+    points_out = np.lib.format.open_memmap(path, mode='w+', dtype=np.float64, shape=(n, number_of_points, 3))
+    features_out = np.lib.format.open_memmap(path[:-len('.npy')] + '_features.npy', mode='w+', dtype=np.float64,
+                                             shape=(n, 6))
+    row = 0
+    for points, features in batches:
+        points_out[row:row + len(points)] = points
+        features_out[row:row + len(features)] = features
+        row += len(points)
+    points_out.flush()
+    features_out.flush()
+
+
 parser = argparse.ArgumentParser(
     description='Generates a random curve')
+parser.add_argument('--n', type=int, default=None,
+                    help='stream n random curves instead of printing a single one')
+parser.add_argument('--seed', type=int, default=0, help='master seed of the stream')
+parser.add_argument('--workers', type=int, default=1, help='number of worker processes')
+parser.add_argument('--batch_size', type=int, default=16, help='curves per batch handed to a worker')
+parser.add_argument('--output', type=str, default=None,
+                    help='output path, a .npy path gives a binary array, otherwise json lines (stdout by default)')
+parser.add_argument('--number_of_points', type=int, default=76, help='points per curve')
+
 if __name__ == "__main__":
     # arguments parser
     args = parser.parse_args()
-    generate_random_curve(number_of_points=76, gear_diff_val=1, stick_diff_val=2, position_diff_val=1)
+    curve_kwargs = dict(number_of_points=args.number_of_points, gear_diff_val=1, stick_diff_val=2, position_diff_val=1)
+    if args.n is None:
+        generate_random_curve(**curve_kwargs)
+    else:
+        batches = stream_random_curves(args.n, seed=args.seed, workers=args.workers, batch_size=args.batch_size,
+                                       **curve_kwargs)
+        if args.output and args.output.endswith('.npy'):
+            write_arrays(batches, args.output, args.n, args.number_of_points)
+        elif args.output:
+            with open(args.output, 'w') as output_file:
+                write_json_lines(batches, output_file)
+        else:
+            write_json_lines(batches, sys.stdout)
@@ -0,0 +1,132 @@
+import os
+import json
+import numpy as np
+from os.path import join as pjoin
+
+MOTION_TABLES_DIR = 'motion_tables'
+
+
+class MotionTable:
+    '''
+    one baked actuator cycle of an assembly: the pose of every component per actuator angle.
+    playback interpolates the table, so it needs no solver calls
+    '''
+    # a start pose with a larger constraint residual norm isn't marked solved (the TraceMonitor threshold)
+    max_residual = 1e-3
+
+    def __init__(self, angles, poses, solved):
+        """
+        :param angles: actuator angles in degrees relative to the start of the cycle, of shape (steps,)
+        :param poses: np array of shape (steps, number of components, 6) of x, y, z, gamma, beta, alpha (radians)
+                      in the order of assembly.components
+        :param solved: bool np array of shape (steps,), False where the solver didn't converge
+        """
+        self.angles = angles
+        self.poses = poses
+        self.solved = solved
+
+    @staticmethod
+    def bake(assembly, steps=72):
+        """
+        solve one full actuator cycle, the assembly ends at the state it started from (one turn later).
+        the start pose is only marked solved if it satisfies the constraints, otherwise it is taken from the
+        solve one turn later when that one does
+        """
+        step_angle = 360 / steps
+        poses = np.zeros((steps, len(assembly.components), 6), dtype=np.float32)
+        solved = np.zeros((steps,), dtype=bool)
+        solved[0] = MotionTable._closes(assembly)
+        for i in range(steps):
+            if i > 0:
+                assembly.actuator.turn(step_angle)
+                solved[i] = assembly.update_state2()
+            MotionTable._record_pose(assembly, poses[i])
+        assembly.actuator.turn(step_angle)
+        if assembly.update_state2() and not solved[0] and MotionTable._closes(assembly):
+            MotionTable._record_pose(assembly, poses[0])
+            solved[0] = True
+        return MotionTable(np.arange(steps) * step_angle, poses, solved)
+
+    @staticmethod
+    def _closes(assembly):
+        return np.linalg.norm(assembly.constraint_residuals(assembly.presolve())) <= MotionTable.max_residual
+
+    @staticmethod
+    def _record_pose(assembly, pose):
+        for j, comp in enumerate(assembly.components):
+            pose[j, :3] = comp.configuration.position.vector()
+            alignment = comp.configuration.alignment
+            pose[j, 3:] = alignment.gamma, alignment.beta, alignment.alpha
+
+    def _steps_around(self, angle):
+        """
+        :return: (i, t) - the baked step before angle and the fraction of the way to the next one
+        """
+        steps = len(self.angles)
+        position = (angle % 360) / (360 / steps)
+        return int(np.floor(position)) % steps, position - np.floor(position)
+
+    def can_interpolate(self, angle):
+        """
+        :return: True if the baked steps pose_at(angle) interpolates between were solved
+        """
+        i, t = self._steps_around(angle)
+        return bool(self.solved[i] and (t == 0 or self.solved[(i + 1) % len(self.angles)]))
+
+    def pose_at(self, angle):
+        """
+        :param angle: actuator angle in degrees relative to the start of the cycle, any value (it wraps)
+        :return: np array of shape (number of components, 6), linearly interpolated between the baked steps
+        :raise ValueError: if a step it interpolates between wasn't solved (see can_interpolate)
+        """
+        if not self.can_interpolate(angle):
+            raise ValueError(f"the motion table has an unsolved step around {angle % 360} degrees")
+        steps = len(self.angles)
+        i, t = self._steps_around(angle)
+        before, after = self.poses[i].astype(np.float64), self.poses[(i + 1) % steps].astype(np.float64)
+        delta = after - before
+        # rotations take the short way around
+        delta[:, 3:] = (delta[:, 3:] + np.pi) % (2 * np.pi) - np.pi
+        return before + t * delta
+
+    def apply(self, assembly, angle):
+        """
+        move the components of assembly to their pose at angle, without solving
+        :raise ValueError: if the pose would be interpolated from an unsolved step
+        """
+        for comp, pose in zip(assembly.components, self.pose_at(angle)):
+            position, alignment = comp.configuration.position, comp.configuration.alignment
+            position.x, position.y, position.z = pose[:3]
+            alignment.gamma, alignment.beta, alignment.alpha = pose[3:]
+
+    def to_json(self, assembly):
+        """
+        :return: json of the poses per step, components described by their type and id like describe_assembly
+        """
+        components = [{'type': type(comp).__name__, 'id': comp.id} for comp in assembly.components]
+        return json.dumps({'components': components, 'angles': self.angles.tolist(),
+                           'poses': self.poses.tolist(), 'solved': self.solved.tolist()})
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            np.savez(f, angles=self.angles, poses=self.poses, solved=self.solved)
+
+    @staticmethod
+    def load(path):
+        with np.load(path) as data:
+            return MotionTable(data['angles'], data['poses'], data['solved'])
+
+
+def get_motion_table(assembly, key, steps=72, cache_dir=MOTION_TABLES_DIR):
+    """
+    the baked motion table of assembly from the disk cache, baked and stored if missing
+    :param key: content key of the assembly (see curve_cache.curve_key)
+    """
+    path = pjoin(cache_dir, f'{key}_{steps}.npz')
+    if os.path.exists(path):
+        return MotionTable.load(path)
+    table = MotionTable.bake(assembly, steps=steps)
+    if not os.path.exists(cache_dir):
+        os.mkdir(cache_dir)
+    table.save(path)
+    return table
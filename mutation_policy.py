@@ -0,0 +1,90 @@
+import time
+import numpy as np
+from collections import defaultdict
+from assembly import MUTATION_GROUPS
+
+# outcomes of a sampled assembly
+ACCEPTED = 'accepted'
+INVALID = 'invalid'
+SIMILAR = 'similar'
+# the trace lost its branch (see assembly.TraceMonitor)
+BROKEN = 'broken'
+
+
+class MutationPolicy:
+    '''
+    adaptive mutation probabilities and step sizes for sample_config_from_current, learned from the outcomes
+    of the sampled assemblies:
+    - every group is credited with the novelty reward of the accepted assemblies it was mutated in, the reward
+      is 1 / (1 + number of accepted curves in the same cell of the weighted features space), so groups that
+      reach sparsely covered regions are mutated more often
+    - an invalid assembly or a broken trace shrinks the steps of its mutated groups and a too similar curve
+      grows them.
+      a too similar curve cost a full trace while an invalid assembly costs almost nothing, so the steps grow
+      a lot faster than they shrink and settle at about 5 invalid assemblies per too similar one
+    '''
+
+    def __init__(self, base_prob=0.5, min_prob=0.1, max_prob=0.9, shrink=0.98, grow=1.1, min_scale=0.25,
+                 max_scale=4.0, cell_size=1.0):
+        """
+        :param base_prob: mutation probability of a group with an average reward
+        :param cell_size: side of the coverage grid cells, in the units of normA
+        """
+        self.base_prob = base_prob
+        self.min_prob = min_prob
+        self.max_prob = max_prob
+        self.shrink = shrink
+        self.grow = grow
+        self.min_scale = min_scale
+        self.max_scale = max_scale
+        self.cell_size = cell_size
+        self.tried = dict.fromkeys(MUTATION_GROUPS, 0)
+        self.reward = dict.fromkeys(MUTATION_GROUPS, 0.0)
+        self.scales = dict.fromkeys(MUTATION_GROUPS, 1.0)
+        self.outcomes = dict.fromkeys((ACCEPTED, INVALID, SIMILAR, BROKEN), 0)
+        self.coverage = defaultdict(int)
+        self.start_time = time.perf_counter()
+
+    def probabilities(self):
+        """
+        :return: dict group -> mutation probability, base_prob scaled by the group's reward rate
+                 relative to the mean rate (with a uniform prior)
+        """
+        rates = {group: (self.reward[group] + 1) / (self.tried[group] + 2) for group in MUTATION_GROUPS}
+        mean_rate = np.mean(list(rates.values()))
+        return {group: float(np.clip(self.base_prob * rate / mean_rate, self.min_prob, self.max_prob))
+                for group, rate in rates.items()}
+
+    def novelty_reward(self, curve):
+        """
+        :return: the reward of an accepted curve, which is counted in its coverage cell
+        """
+        # the signature starts with the A-weighted features
+        cell = tuple(np.floor(curve.signature[:6] / self.cell_size).astype(int))
+        self.coverage[cell] += 1
+        return 1 / self.coverage[cell]
+
+    def update(self, mutated, outcome, curve=None):
+        """
+        :param mutated: the groups sample_config_from_current mutated
+        :param outcome: ACCEPTED, INVALID, SIMILAR or BROKEN
+        :param curve: the accepted curve
+        """
+        self.outcomes[outcome] += 1
+        reward = self.novelty_reward(curve) if outcome == ACCEPTED else 0.0
+        factor = {INVALID: self.shrink, BROKEN: self.shrink, SIMILAR: self.grow}.get(outcome, 1.0)
+        for group in mutated:
+            self.tried[group] += 1
+            self.reward[group] += reward
+            self.scales[group] = float(np.clip(self.scales[group] * factor, self.min_scale, self.max_scale))
+
+    def accepted_per_second(self):
+        return self.outcomes[ACCEPTED] / max(time.perf_counter() - self.start_time, 1e-9)
+
+    def summary(self):
+        probabilities = self.probabilities()
+        lines = [f"{self.accepted_per_second():.2f} accepted/s, outcomes {self.outcomes}, "
+                 f"{len(self.coverage)} feature cells covered"]
+        lines += [f"  {group:<20} p {probabilities[group]:.2f} step x{self.scales[group]:.2f}"
+                  for group in MUTATION_GROUPS]
+        return '\n'.join(lines)
@@ -0,0 +1,160 @@
+"""
+builds the unweighted normA difference vectors (6 feature deltas, f7, f8) for many curve pairs, for fitting Curve.A.
+the result is a memory mapped .npy, re-weighting it with any A is then a cheap contraction (see reweight)
+usage:
+python pairwise_differences.py path/to/db out.npy                          all pairs, shape (N, N, 8)
+python pairwise_differences.py path/to/db out.npy --pairs pairs.npy        selected pairs (P, 2), shape (P, 8)
+"""
+import argparse
+import numpy as np
+from multiprocessing import Pool
+from curve import Curve
+
+# descriptor arrays of the db curves, set in every worker by _init_worker
+_descriptors = None
+
+
+def curve_descriptor_arrays(curves):
+    """
+    stack the stored descriptors of curves (all of the same number of points) into arrays
+    :return: dict of arrays indexed by curve
+    """
+    for c in curves:
+        c.refresh_descriptors()
+    num_p = len(curves[0].points)
+    if any(len(c.points) != num_p for c in curves):
+        raise ValueError("all curves must have the same number of points")
+    return {'num_p': num_p,
+            'features': np.array([c.features for c in curves]),
+            'points_fft': np.array([c._points_fft for c in curves]),
+            'points_sq_norm': np.array([c._points_sq_norm for c in curves]),
+            'curvature_fft': np.array([c._curvature_fft for c in curves]),
+            'curvature_sq_norm': np.array([c._curvature_sq_norm for c in curves])}
+
+
+def _min_cyclic_sq_distances(a_fft, a_sq_norm, b_fft, b_sq_norm, num_p, outer):
+    """
+    batched Curve._min_cyclic_sq_distance
+    :param outer: if True compare every a with every b (result of shape (len(a), len(b))),
+                  otherwise compare a[p] with b[p] (result of shape (len(a),))
+    """
+    if outer:
+        cross_spectrum = np.einsum('ifd,jfd->ijf', np.conj(a_fft), b_fft)
+        sq_norms = a_sq_norm[:, None] + b_sq_norm[None, :]
+    else:
+        cross_spectrum = np.einsum('pfd,pfd->pf', np.conj(a_fft), b_fft)
+        sq_norms = a_sq_norm + b_sq_norm
+    correlation = np.fft.irfft(cross_spectrum, num_p, axis=-1)
+    return np.maximum(sq_norms - 2 * np.max(correlation, axis=-1), 0.0)
+
+
+def differences(descriptors, rows, cols, outer=True):
+    """
+    :param rows, cols: curve indices
+    :param outer: all (row, col) combinations if True, else the pairs zip(rows, cols)
+    :return: difference vectors of shape (len(rows), len(cols), 8) if outer else (len(rows), 8)
+    """
+    d = descriptors
+    num_p = d['num_p']
+    if outer:
+        features = d['features'][rows][:, None, :] - d['features'][cols][None, :, :]
+    else:
+        features = d['features'][rows] - d['features'][cols]
+    f7 = _min_cyclic_sq_distances(d['points_fft'][rows], d['points_sq_norm'][rows], d['points_fft'][cols],
+                                  d['points_sq_norm'][cols], num_p, outer)
+    f8 = _min_cyclic_sq_distances(d['curvature_fft'][rows], d['curvature_sq_norm'][rows], d['curvature_fft'][cols],
+                                  d['curvature_sq_norm'][cols], num_p, outer)
+    return np.concatenate([features, np.sqrt(f7 / num_p)[..., None], np.sqrt(f8)[..., None]], axis=-1)
+
+
+def reweight(differences_array, A=None):
+    """
+    :return: normA for every difference vector in differences_array (shape (..., 8)) with the weights A
+    """
+    return Curve.weighted_norm(differences_array, A)
+
+
+def _init_worker(descriptors):
+    global _descriptors
+    _descriptors = descriptors
+
+
+def _all_pairs_tile(task):
+    """
+    compute one tile of the all pairs tensor and write it, and its mirror tile, to the output file
+    """
+    output_path, row_start, row_end, col_start, col_end = task
+    out = np.load(output_path, mmap_mode='r+')
+    tile = differences(_descriptors, np.arange(row_start, row_end), np.arange(col_start, col_end), outer=True)
+    out[row_start:row_end, col_start:col_end] = tile
+    if row_start != col_start:
+        # f7 and f8 are symmetric, the feature deltas change sign
+        mirror = tile.transpose(1, 0, 2).copy()
+        mirror[..., :6] *= -1
+        out[col_start:col_end, row_start:row_end] = mirror
+    out.flush()
+    return (row_end - row_start) * (col_end - col_start)
+
+
+def _pairs_block(task):
+    output_path, pairs, start = task
+    out = np.load(output_path, mmap_mode='r+')
+    out[start:start + len(pairs)] = differences(_descriptors, pairs[:, 0], pairs[:, 1], outer=False)
+    out.flush()
+    return len(pairs)
+
+
+def build_differences(curves, output_path, pairs=None, block_size=128, workers=1, dtype=np.float32):
+    """
+    :param curves: list of curves
+    :param output_path: .npy path of the output
+    :param pairs: np array of shape (P, 2) of curve indices, all pairs if None
+    :param block_size: tile side for all pairs (pairs chunks hold block_size ** 2 pairs)
+    :param workers: size of the process pool
+    :return: the memory mapped result
+    """
+    descriptors = curve_descriptor_arrays(curves)
+    n = len(curves)
+    if pairs is None:
+        shape = (n, n, 8)
+        starts = range(0, n, block_size)
+        tasks = [(output_path, i, min(i + block_size, n), j, min(j + block_size, n)) for i in starts for j in starts
+                 if i <= j]
+        work = _all_pairs_tile
+    else:
+        pairs = np.asarray(pairs, dtype=np.int64)
+        shape = (len(pairs), 8)
+        chunk = block_size * block_size
+        tasks = [(output_path, pairs[i:i + chunk], i) for i in range(0, len(pairs), chunk)]
+        work = _pairs_block
+    out = np.lib.format.open_memmap(output_path, mode='w+', dtype=dtype, shape=shape)
+    del out
+    if workers <= 1:
+        _init_worker(descriptors)
+        for task in tasks:
+            work(task)
+    else:
+        with Pool(workers, initializer=_init_worker, initargs=(descriptors,)) as pool:
+            for _ in pool.imap_unordered(work, tasks):
+                pass
+    return np.load(output_path, mmap_mode='r')
+
+
+parser = argparse.ArgumentParser(description='build the normA difference vectors of db curve pairs')
+parser.add_argument('db_path', type=str, help='sampler (db) path')
+parser.add_argument('output_path', type=str, help='output .npy path')
+parser.add_argument('--pairs', type=str, default=None, help='.npy of shape (P, 2) of curve index pairs')
+parser.add_argument('--block_size', type=int, default=128, help='tile side')
+parser.add_argument('--workers', type=int, default=1, help='number of worker processes')
+
+
+def main(db_path, output_path, pairs=None, block_size=128, workers=1):
+    from sampler import AssemblyA_Sampler
+    curves = AssemblyA_Sampler.load(db_path).get_curve_database()
+    build_differences(curves, output_path, pairs=None if pairs is None else np.load(pairs), block_size=block_size,
+                      workers=workers)
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    main(**vars(args))
@@ -0,0 +1,156 @@
+import json
+import sys
+import time
+import threading
+import socketserver
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from curve import Curve
+
+
+def match_curve(sample, curve, n_candidates=None):
+    """
+    find the db assembly whose curve is closest to curve
+    :param sample: an AssemblyA_Sampler or a ShardedDatabase (the db)
+    :param n_candidates: re-rank only this many signature neighbors (approximate),
+                         by default the search is exact
+    :return: the json-able result the UI expects: the closest curve and the assembly description
+    """
+    _, db_closest_curve, assembly = sample.nearest(curve, k=1, n_candidates=n_candidates)[0]
+    c = {}
+    c['curve'] = {'points': db_closest_curve.points.tolist(), 'features': db_closest_curve.features.tolist()}
+    c['assembly'] = {'components': assembly.describe_assembly()}
+    return c
+
+
+class ServerMetrics:
+    '''
+    request counters, concurrency and latency of a QueryServer
+    '''
+
+    def __init__(self, latency_window=1000):
+        self._lock = threading.Lock()
+        self.start_time = time.time()
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.latencies = deque(maxlen=latency_window)
+
+    def request_started(self):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        return time.perf_counter()
+
+    def request_finished(self, start, failed=False):
+        latency = time.perf_counter() - start
+        with self._lock:
+            self.in_flight -= 1
+            self.requests += 1
+            self.errors += int(failed)
+            self.latencies.append(latency)
+
+    def snapshot(self):
+        with self._lock:
+            latencies = sorted(self.latencies)
+            snapshot = {'uptime_s': time.time() - self.start_time,
+                        'requests': self.requests,
+                        'errors': self.errors,
+                        'in_flight': self.in_flight,
+                        'max_in_flight': self.max_in_flight}
+        if latencies:
+            snapshot['latency_ms'] = {'mean': 1000 * sum(latencies) / len(latencies),
+                                      'p50': 1000 * latencies[len(latencies) // 2],
+                                      'p95': 1000 * latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))],
+                                      'max': 1000 * latencies[-1]}
+        return snapshot
+
+
+class QueryServer:
+    '''
+    long running matcher for user curves: loads the db once and keeps its index warm.
+    requests and responses are json lines:
+    {"id": .., "points": [[x, y, z], ..]} or {"id": .., "json_path": path} -> the same json as the one shot script
+    {"cmd": "metrics"} -> the server metrics
+    '''
+
+    def __init__(self, sample, n_candidates=None, workers=4):
+        self.sample = sample
+        self.n_candidates = n_candidates
+        self.workers = workers
+        self.metrics = ServerMetrics()
+        # build the index now so the first request doesn't pay for it
+        self.sample.warm_up()
+        self._index_lock = threading.Lock()
+
+    def handle(self, request):
+        """
+        :param request: a decoded json request
+        :return: a json-able response
+        """
+        if request.get('cmd') == 'metrics':
+            return self.metrics.snapshot()
+        start = self.metrics.request_started()
+        failed = False
+        try:
+            if 'points' in request:
+                curve = Curve(request['points'])
+            else:
+                with open(request['json_path'], 'r') as j:
+                    curve = Curve(json.loads(j.read()))
+            with self._index_lock:
+                # syncing the index must not race, the db itself is read only here
+                self.sample.warm_up()
+            response = match_curve(self.sample, curve, n_candidates=request.get('candidates', self.n_candidates))
+        except Exception as e:
+            failed = True
+            response = {'error': f'{type(e).__name__}: {e}'}
+        finally:
+            self.metrics.request_finished(start, failed=failed)
+        if 'id' in request:
+            response['id'] = request['id']
+        return response
+
+    def handle_line(self, line):
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            return json.dumps({'error': f'bad request: {e}'})
+        return json.dumps(self.handle(request))
+
+    def serve_stdin(self, input_stream=sys.stdin, output_stream=sys.stdout):
+        """
+        answer json line requests from input_stream until it is closed.
+        requests are handled concurrently so responses may come out of order, match them by "id"
+        """
+        output_lock = threading.Lock()
+
+        def answer(line):
+            response = self.handle_line(line)
+            with output_lock:
+                output_stream.write(response + '\n')
+                output_stream.flush()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for line in input_stream:
+                if line.strip():
+                    pool.submit(answer, line)
+
+    def serve_tcp(self, host='127.0.0.1', port=5005):
+        """
+        answer json line requests on a localhost socket, each connection is served by its own thread
+        """
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    if line.strip():
+                        self.wfile.write((server.handle_line(line.decode()) + '\n').encode())
+                        self.wfile.flush()
+
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        with socketserver.ThreadingTCPServer((host, port), Handler) as tcp_server:
+            tcp_server.daemon_threads = True
+            tcp_server.serve_forever()
@@ -0,0 +1,218 @@
+import os
+import numpy as np
+from multiprocessing import Pool
+from os.path import join as pjoin
+
+
+class CurveRenderer:
+    '''
+    renders curves to image files on a single Agg canvas, updating the line data instead of creating
+    a figure per curve. the figure is not registered with pyplot, so nothing is kept alive after close
+    '''
+
+    def __init__(self, figsize=(6.4, 4.8), dpi=100):
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        self.figure = Figure(figsize=figsize, dpi=dpi)
+        self.canvas = FigureCanvasAgg(self.figure)
+        self.ax = self.figure.add_subplot(111)
+        self.line, = self.ax.plot([], [])
+
+    def render(self, points, path):
+        """
+        :param points: curve points of shape (n, 2 or 3), drawn as a closed ring
+        :param path: image path
+        """
+        ring = np.concatenate([points, points[:1]])
+        self.line.set_data(ring[:, 0], ring[:, 1])
+        self.ax.relim()
+        self.ax.autoscale_view()
+        self.canvas.print_figure(path)
+
+    def close(self):
+        self.figure.clear()
+        self.figure = self.canvas = self.ax = self.line = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _render_chunk(task):
+    out_dir, chunk = task
+    with CurveRenderer() as renderer:
+        for idx, points in chunk:
+            renderer.render(points, pjoin(out_dir, f'{idx}.png'))
+    return len(chunk)
+
+
+def render_curves(curves, out_dir='db_plots', workers=1, incremental=False, chunk_size=64):
+    """
+    render every curve to <out_dir>/<index>.png
+    :param curves: list of curves
+    :param workers: size of the process pool, every worker reuses one canvas for its chunks
+    :param incremental: only render curves that don't have an image yet
+    :return: number of rendered curves
+    """
+    if not os.path.exists(out_dir):
+        os.mkdir(out_dir)
+    todo = [(i, c.points) for i, c in enumerate(curves)
+            if not (incremental and os.path.exists(pjoin(out_dir, f'{i}.png')))]
+    tasks = [(out_dir, todo[i:i + chunk_size]) for i in range(0, len(todo), chunk_size)]
+    if workers <= 1:
+        for task in tasks:
+            _render_chunk(task)
+    else:
+        with Pool(workers) as pool:
+            for _ in pool.imap_unordered(_render_chunk, tasks):
+                pass
+    return len(todo)
+
+
+class AssemblyAnimator:
+    '''
+    draws an assembly (and optionally its curve) on a single Agg figure. every component gets its artists once,
+    each frame only updates their data and the frame is rendered straight into memory
+    '''
+
+    def __init__(self, assembly, curve=None, user_fig=None, figsize=(6.4, 4.8), dpi=100):
+        """
+        :param assembly: the assembly to draw
+        :param curve: a curve drawn under the assembly
+        :param user_fig: components of this assembly are drawn in black (like in plot_assembly)
+        """
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from parts import Gear, Stick
+        self.assembly = assembly
+        self.figure = Figure(figsize=figsize, dpi=dpi)
+        self.canvas = FigureCanvasAgg(self.figure)
+        self.ax = self.figure.add_subplot(111)
+        if curve is not None:
+            ring = np.concatenate([curve.points, curve.points[:1]])
+            self.ax.plot(ring[:, 0], ring[:, 1])
+
+        user_components = user_fig.components if user_fig is not None else []
+        self._sticks = []
+        self._gears = []
+        for comp in assembly.components:
+            in_user_fig = any(comp is c for c in user_components)
+            if isinstance(comp, Stick):
+                line, = self.ax.plot([], [], '-k' if in_user_fig else '-r', alpha=0.5, linewidth=2)
+                self._sticks.append((comp, line))
+            if isinstance(comp, Gear):
+                circle, = self.ax.plot([], [])
+                direction, = self.ax.plot([], [], 'k-' if in_user_fig else 'y-', alpha=0.5, linewidth=2)
+                self._gears.append((comp, circle, direction))
+        self._theta = np.linspace(0, 2 * np.pi, 100)
+        self.ax.set_xlim(-20, 50)
+        self.ax.set_ylim(-50, 50)
+        self.ax.grid(linestyle='--')
+        self.ax.set_aspect('equal')
+
+    def update(self):
+        """
+        move the artists to the current state of the assembly
+        """
+        from configuration import Point
+        for comp, line in self._sticks:
+            edge1 = comp.configuration.position.vector()[:2]
+            edge2 = comp.get_global_position(Point(comp.length, 0, 0))[:2]
+            line.set_data((edge1[0], edge2[0]), (edge1[1], edge2[1]))
+        for comp, circle, direction in self._gears:
+            center = comp.configuration.position.vector()[:2]
+            tip = comp.get_global_position(Point(comp.radius, 0, 0))[:2]
+            circle.set_data(comp.radius * np.cos(self._theta) + center[0],
+                            comp.radius * np.sin(self._theta) + center[1])
+            direction.set_data((center[0], tip[0]), (center[1], tip[1]))
+
+    def render_frame(self):
+        """
+        :return: the current state as a PIL image, rendered in memory
+        """
+        from PIL import Image
+        self.update()
+        self.canvas.draw()
+        return Image.frombuffer('RGBA', self.canvas.get_width_height(), bytes(self.canvas.buffer_rgba()),
+                                'raw', 'RGBA', 0, 1).convert('RGB')
+
+    def frames(self, number_of_frames=72, step_angle=5, motion_table=None):
+        """
+        render the current state and then a frame after every turn of the actuator by step_angle
+        :param motion_table: a baked MotionTable of the assembly, poses are then interpolated from it
+                             instead of solved. frames next to an unsolved step keep the last pose
+        """
+        if motion_table is not None:
+            frames = []
+            for i in range(number_of_frames):
+                if motion_table.can_interpolate(i * step_angle):
+                    motion_table.apply(self.assembly, i * step_angle)
+                frames.append(self.render_frame())
+            return frames
+        frames = [self.render_frame()]
+        for i in range(number_of_frames - 1):
+            self.assembly.actuator.turn(step_angle)
+            self.assembly.update_state2()
+            frames.append(self.render_frame())
+        return frames
+
+    def close(self):
+        self.figure.clear()
+        self.figure = self.canvas = self.ax = None
+
+
+def encode_animation(frames, format='gif', duration=5):
+    """
+    encode frames without writing anything to disk
+    :param frames: list of PIL images of the same size
+    :param format: 'gif', 'webp' (both by PIL) or 'mp4' (needs an ffmpeg executable)
+    :param duration: milliseconds per frame
+    :return: the encoded animation bytes
+    """
+    import io
+    if format in ('gif', 'webp'):
+        buffer = io.BytesIO()
+        frames[0].save(buffer, format=format.upper(), append_images=frames[1:], save_all=True, duration=duration,
+                       loop=0)
+        return buffer.getvalue()
+    if format == 'mp4':
+        import subprocess
+        width, height = frames[0].size
+        # fragmented mp4 can be written to a pipe
+        command = ['ffmpeg', '-loglevel', 'error', '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', f'{width}x{height}',
+                   '-r', str(1000 / duration), '-i', 'pipe:0', '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2',
+                   '-pix_fmt', 'yuv420p', '-movflags', 'frag_keyframe+empty_moov', '-f', 'mp4', 'pipe:1']
+        result = subprocess.run(command, input=b''.join(f.tobytes() for f in frames), stdout=subprocess.PIPE,
+                                check=True)
+        return result.stdout
+    raise ValueError(f"unknown animation format {format}")
+
+
+# the db of the animation workers, loaded once per worker by _init_animation_worker
+_animation_db = None
+
+
+def _init_animation_worker(db_path):
+    global _animation_db
+    from sampler import AssemblyA_Sampler
+    _animation_db = AssemblyA_Sampler.load(db_path)
+
+
+def _animate(task):
+    idx, figure, format, out_dir = task
+    return _animation_db.plot_with_figure(idx, figure=figure, format=format, out_dir=out_dir)
+
+
+def render_animations(db_path, indices, figure='snake', format='gif', out_dir='gifs', workers=1):
+    """
+    animate many db entries, every worker loads the db once
+    :return: list of the written animation paths
+    """
+    tasks = [(idx, figure, format, out_dir) for idx in indices]
+    if workers <= 1:
+        _init_animation_worker(db_path)
+        return [_animate(task) for task in tasks]
+    with Pool(workers, initializer=_init_animation_worker, initargs=(db_path,)) as pool:
+        return pool.map(_animate, tasks)
@@ -1,47 +1,189 @@
 import os
+import time
 import dill
-from PIL import Image
+import hashlib
 from os.path import join as pjoin
 from assembly import *
+from curve_index import CurveIndex
+
+CURVE_CACHE_PATH = 'curve_cache.sqlite'
+# version of the db file layout written by AssemblyA_Sampler.save
+DB_FORMAT_VERSION = 1
+# probe curves with a smaller pca aspect ratio (feature 2) aren't used to reject, the normA of thin curves
+# is dominated by the curvature at their turns, which the probe misses
+PROBE_MIN_ASPECT = 0.03
+# the probe costs about a quarter of a full trace and its states save about a sixth of the full trace after it.
+# on the probe cases of benchmarks/run_benchmarks.py (43% of the valid samples too similar) it caught 14 of the 29
+# too similar samples without rejecting a dissimilar one, and always probing ran as fast as never probing
+PROBE_MIN_SIMILAR_RATE = 0.4
+
+
+def spawn_rngs(seed, n):
+    """
+    independent random streams derived from one master seed, e.g. one per worker
+    :param seed: master seed, None takes fresh entropy
+    :return: list of n random.Random
+    """
+    if seed is None:
+        seed = random.SystemRandom().getrandbits(128)
+    # a hash of (seed, i) per stream, so nearby seeds and indices still give unrelated streams
+    return [random.Random(int.from_bytes(hashlib.sha256(f'{seed}:{i}'.encode()).digest(), 'big')) for i in range(n)]
+
+
+def _generate_shard(args):
+    """
+    generate a db in a worker process
+    :return: the dill pickled sampler
+    """
+    n, rng, number_of_points, num_of_samples_around, debug_mode, strategy, adaptive = args
+    sample = AssemblyA_Sampler(number_of_points=number_of_points, num_of_samples_around=num_of_samples_around,
+                               rng=rng)
+    sample.create_mixed_database(n, debug_mode=debug_mode, strategy=strategy, adaptive=adaptive)
+    return dill.dumps(sample)
 
 
 class AssemblyA_Sampler:
-    def __init__(self, number_of_points=72, num_of_samples_around=10):
+    # the global random module, unless the sampler was given its own stream
+    rng = random
+    probe_points = 12
+    probe_gamma = 0.5
+    probe_min_similar_rate = PROBE_MIN_SIMILAR_RATE
+    # moving average of the share of valid samples that were too similar to the db
+    similar_rate = 0.0
+
+    def __init__(self, number_of_points=72, num_of_samples_around=10, rng=None, probe_points=12, probe_gamma=0.5,
+                 probe_min_similar_rate=PROBE_MIN_SIMILAR_RATE):
+        """
+        :param rng: a random.Random all the sampling draws from, the global random module by default
+        :param probe_points: a valid sampled assembly is first traced at this many points (a divisor of
+                             number_of_points, 0 disables the probe) and rejected without the full trace if the
+                             interpolated probe curve is closer than probe_gamma to a db curve.
+                             the probe is an estimate, not a bound, the probe cases of benchmarks/run_benchmarks.py
+                             measure its false rejections and its speed up
+        :param probe_min_similar_rate: the probe is only used while similar_rate is at least this, 0 always probes.
+                                       while a db is small most valid samples are dissimilar and the default
+                                       leaves the probe off
+        """
         self.database = []
         self.curve_database = []
         self.number_of_points = number_of_points
         self.num_of_samples_around = num_of_samples_around
+        self.probe_points = probe_points
+        self.probe_gamma = probe_gamma
+        self.probe_min_similar_rate = probe_min_similar_rate
+        if rng is not None:
+            self.rng = rng
 
     def recursive_sample_assemblyA(self, assemblyA, num_of_samples_around=None, debug_mode=False, second_type=False):
         if not num_of_samples_around:
             num_of_samples_around = self.num_of_samples_around
+        return [assembly for assembly, _ in self._sample_around(assemblyA, num_of_samples_around,
+                                                                debug_mode=debug_mode, second_type=second_type)]
+
+    def _sample_around(self, assemblyA, num_of_samples_around, debug_mode=False, second_type=False, novelty=False,
+                       policy=None):
+        """
+        sample assemblies around assemblyA, the valid ones whose curves are dissimilar to the db are added to
+        curve_database
+        :param novelty: measure the normA distance of every accepted curve to the closest db curve
+                        (an exact nearest search, slower than the dissimilarity test)
+        :param policy: a mutation_policy.MutationPolicy that picks the mutations and learns from their outcomes,
+                       by default every parameter group is mutated with probability 0.5
+        :return: list of (accepted assembly, novelty), novelty is 0 unless measured
+        """
+        from mutation_policy import ACCEPTED, INVALID, SIMILAR, BROKEN
         accepted_assemblies = []
         for i in range(num_of_samples_around):
-            new_assemblyA = sample_from_cur_assemblyA(assemblyA, random_sample=0.5, second_type=second_type)
+            if policy:
+                config = copy.deepcopy(assemblyA.config)
+                mutated = sample_config_from_current(config, mutation_probs=policy.probabilities(),
+                                                     step_scales=policy.scales, second_type=second_type, rng=self.rng)
+                new_assemblyA = AssemblyA(config)
+            else:
+                new_assemblyA = sample_from_cur_assemblyA(assemblyA, random_sample=0.5, second_type=second_type,
+                                                          rng=self.rng)
+            outcome = INVALID
             if is_vaild_assembleA(new_assemblyA, debug_mode=debug_mode):
                 if debug_mode:
                     print("valid assembly!")
-                assembly_curve = get_assembly_curve(new_assemblyA, number_of_points=self.number_of_points,
-                                                    normelaize_curve=True)
-                if is_dissimilar(assembly_curve, self.curve_database):
+                probe_curve, known_states = None, None
+                if self.similar_rate >= self.probe_min_similar_rate:
+                    probe_curve, known_states = self.probe_curve(new_assemblyA)
+                if probe_curve is not None and not is_dissimilar(probe_curve, self.get_curve_index(),
+                                                                 gamma=self.probe_gamma):
+                    outcome = SIMILAR
                     if debug_mode:
-                        print(f"----------------added assembly {len(self.curve_database)}----------------")
-                    self.curve_database.append(assembly_curve)
-                    accepted_assemblies.append(new_assemblyA)
-                elif (debug_mode):
-                    print(f"assembly too similar to db")
+                        print("probe curve too similar to db")
+                else:
+                    assembly_curve = get_assembly_curve(new_assemblyA, number_of_points=self.number_of_points,
+                                                        normelaize_curve=True, known_states=known_states,
+                                                        check_branch=True)
+                    # a broken trace is stopped at the broken step, before the remaining solves and the features
+                    if not self.is_full_trace(assembly_curve):
+                        outcome = BROKEN
+                        if debug_mode:
+                            print("assembly lost its branch while tracing")
+                    else:
+                        distance = 0.0
+                        if novelty:
+                            closest = self.get_curve_index().nearest(assembly_curve, exact=True)
+                            distance = closest[0][0] if closest else np.inf
+                            # the is_dissimilar rule
+                            accepted = distance >= 1
+                        else:
+                            accepted = is_dissimilar(assembly_curve, self.get_curve_index())
+                        outcome = ACCEPTED if accepted else SIMILAR
+                        if accepted:
+                            if debug_mode:
+                                print(f"----------------added assembly {len(self.curve_database)}----------------")
+                            self.curve_database.append(assembly_curve)
+                            accepted_assemblies.append((new_assemblyA, distance))
+                        elif (debug_mode):
+                            print(f"assembly too similar to db")
+            if outcome not in (INVALID, BROKEN):
+                self.similar_rate += 0.05 * ((outcome == SIMILAR) - self.similar_rate)
+            if policy:
+                policy.update(mutated, outcome, assembly_curve if outcome == ACCEPTED else None)
 
         return accepted_assemblies
 
+    def is_full_trace(self, curve):
+        """
+        :param curve: what get_assembly_curve(check_branch=True) returned
+        :return: False for a broken trace (None) or a curve with dropped points
+        """
+        return curve is not None and len(curve.points) >= self.number_of_points
+
+    def probe_curve(self, assemblyA):
+        """
+        trace a copy of assemblyA at probe_points angles and interpolate the curve to number_of_points
+        :return: (normalized probe curve, solved states for get_assembly_curve(known_states=...)),
+                 or (None, None) if probing is off, doesn't divide number_of_points or a solve failed.
+                 the curve is None for thin curves, whose estimate isn't reliable
+        """
+        if not self.probe_points or self.number_of_points % self.probe_points:
+            return None, None
+        points, states = trace_coarse_curve(AssemblyA(copy.deepcopy(assemblyA.config)), self.probe_points,
+                                            self.number_of_points)
+        if points is None:
+            return None, None
+        # probe point i is the point of step (i + 1) * step - 1 of the full trace
+        step = self.number_of_points // self.probe_points
+        points = np.roll(resample_closed_curve(points, self.number_of_points), step - 1, axis=0)
+        curve = Curve(normalize_curve2(points))
+        if curve.features[2] < PROBE_MIN_ASPECT:
+            return None, states
+        return curve, states
+
     def get_origin_assembly(self, second_type=False):
-        origin_assembly = create_assemblyA(second_type=second_type)
+        origin_assembly = create_assemblyA(second_type=second_type, rng=self.rng)
         origin_curve = get_assembly_curve(origin_assembly, number_of_points=self.number_of_points,
-                                          normelaize_curve=True)
+                                          normelaize_curve=True, check_branch=True)
 
-        while not is_dissimilar(origin_curve, self.curve_database):
-            origin_assembly = create_assemblyA(second_type=second_type)
+        while not self.is_full_trace(origin_curve) or not is_dissimilar(origin_curve, self.get_curve_index()):
+            origin_assembly = create_assemblyA(second_type=second_type, rng=self.rng)
             origin_curve = get_assembly_curve(origin_assembly, number_of_points=self.number_of_points,
-                                              normelaize_curve=True)
+                                              normelaize_curve=True, check_branch=True)
 
         self.database += [origin_assembly]
         self.curve_database += [origin_curve]
@@ -49,36 +191,105 @@ class AssemblyA_Sampler:
         return origin_assembly, origin_curve
 
     def create_assemblyA_database(self, min_samples_number=1000, num_of_samples_around=None, debug_mode=False,
-                                  second_type=False):
+                                  second_type=False, strategy='bfs', max_frontier=10000, restart_prob=0.0,
+                                  adaptive=False):
+        """
+        add min_samples_number assemblies (or a few more). starting from a random origin assembly, the sampler
+        samples around the assemblies of a frontier, every accepted assembly joins the frontier
+        :param strategy: the order the frontier is explored in, see frontier.STRATEGIES: 'bfs', 'novelty'
+                         (the assembly whose curve was farthest from the db first) or 'random',
+                         or a frontier.Frontier
+        :param max_frontier: most config records kept in the frontier
+        :param restart_prob: probability to sample around a new origin assembly instead of the frontier,
+                             which is always done when the frontier is empty
+        :param adaptive: pick the mutations with a mutation_policy.MutationPolicy that learns which parameter groups
+                         and step sizes produce valid novel curves
+        :return: the rate of added assemblies per second
+        """
+        from frontier import make_frontier
+        from mutation_policy import MutationPolicy
+        from config_records import config_to_record, record_to_config
         if not num_of_samples_around:
             num_of_samples_around = self.num_of_samples_around
         cur_database_len = len(self.database)
-
-        origin_assembly, _ = self.get_origin_assembly(second_type=second_type)
-
-        if debug_mode:
-            print(f"origin_assembly initiaized")
-            print(f"curve_database is {self.curve_database}")
+        frontier = make_frontier(strategy, max_size=max_frontier, rng=self.rng)
+        policy = MutationPolicy() if adaptive else None
+        start_time = time.perf_counter()
 
         while len(self.database) - cur_database_len < min_samples_number:
+            if not len(frontier) or (restart_prob and self.rng.random() < restart_prob):
+                if debug_mode:
+                    print("---we will get another origin assembly---")
+                assemblyA, _ = self.get_origin_assembly(second_type=second_type)
+                if debug_mode:
+                    print(f"origin_assembly initiaized")
+            else:
+                assemblyA = AssemblyA(record_to_config(frontier.pop()))
             if debug_mode:
-                print(f"current database size {len(self.database)}")
-            accepted_assemblies = self.recursive_sample_assemblyA(origin_assembly,
-                                                                  num_of_samples_around=num_of_samples_around,
-                                                                  debug_mode=debug_mode, second_type=second_type)
-            self.database += accepted_assemblies
-            while len(accepted_assemblies) > 0 and len(self.database) < min_samples_number:
-                origin_assembly = accepted_assemblies[0]
-                neighbor_accepted_assemblies = self.recursive_sample_assemblyA(origin_assembly,
-                                                                               num_of_samples_around=num_of_samples_around,
-                                                                               debug_mode=debug_mode,
-                                                                               second_type=second_type)
-                self.database += neighbor_accepted_assemblies
-                accepted_assemblies = accepted_assemblies[1:]
-                accepted_assemblies += neighbor_accepted_assemblies
-            if debug_mode:
-                print("---we will get another origin assembly---")
-            origin_assembly, _ = self.get_origin_assembly()
+                print(f"current database size {len(self.database)}, frontier size {len(frontier)}")
+            accepted = self._sample_around(assemblyA, num_of_samples_around, debug_mode=debug_mode,
+                                           second_type=second_type, novelty=frontier.uses_novelty, policy=policy)
+            for new_assemblyA, novelty in accepted:
+                self.database.append(new_assemblyA)
+                frontier.push(config_to_record(new_assemblyA.config), novelty)
+        added = len(self.database) - cur_database_len
+        accepted_per_second = added / max(time.perf_counter() - start_time, 1e-9)
+        if debug_mode:
+            print(f"added {added} assemblies, {accepted_per_second:.2f} accepted/s, "
+                  f"{frontier.dropped} frontier records dropped")
+            if policy:
+                print(policy.summary())
+        return accepted_per_second
+
+    def create_mixed_database(self, n, debug_mode=False, strategy='bfs', adaptive=False):
+        """
+        add n assemblies, 3/4 of the first type and 1/4 of the second
+        :param strategy, adaptive: see create_assemblyA_database
+        """
+        self.create_assemblyA_database((3 * n) // 4, debug_mode=debug_mode, second_type=False, strategy=strategy,
+                                       adaptive=adaptive)
+        self.create_assemblyA_database(n // 4, debug_mode=debug_mode, second_type=True, strategy=strategy,
+                                       adaptive=adaptive)
+
+    def create_database_parallel(self, n, seed=None, workers=1, debug_mode=False, strategy='bfs', adaptive=False):
+        """
+        add about n assemblies, generated by worker processes with independent random streams derived from seed.
+        every worker builds its own db (see create_mixed_database) and they are merged in worker order,
+        so the result only depends on seed and workers
+        :return: number of added assemblies, curves too similar to already merged ones are dropped
+        """
+        shards = [(n // workers + (i < n % workers), rng, self.number_of_points, self.num_of_samples_around, debug_mode,
+                   strategy, adaptive) for i, rng in enumerate(spawn_rngs(seed, workers))]
+        if workers <= 1:
+            return sum(self.merge(dill.loads(_generate_shard(shard))) for shard in shards)
+        from multiprocessing import Pool
+        with Pool(workers) as pool:
+            return sum(self.merge(dill.loads(shard)) for shard in pool.imap(_generate_shard, shards))
+
+    def merge(self, other, gamma=1):
+        """
+        append the assemblies of other whose curves are dissimilar to every curve already in the db
+        :return: number of added assemblies
+        """
+        from config_records import AssemblyRecords
+        # records are copied as they are, without building the assemblies
+        copy_records = isinstance(self.database, AssemblyRecords) and isinstance(other.database, AssemblyRecords)
+        added = 0
+        for i, curve in enumerate(other.curve_database):
+            if is_dissimilar(curve, self.get_curve_index(), gamma=gamma):
+                if copy_records:
+                    self.database.append_record(other.database.record(i))
+                else:
+                    self.database.append(other.database[i])
+                self.curve_database.append(curve)
+                added += 1
+        return added
+
+    def __getstate__(self):
+        # the curve index is rebuilt from curve_database on demand, no need to store it with the db
+        state = self.__dict__.copy()
+        state.pop('curve_index', None)
+        return state
 
     def get_database(self):
         return self.database
@@ -86,7 +297,38 @@ class AssemblyA_Sampler:
     def get_curve_database(self):
         return self.curve_database
 
-    def get_closest_curve(self, curve, get_all_dis=False):
+    def get_curve_index(self):
+        """
+        :return: the signature index of curve_database, updated with any newly added curves
+        """
+        if getattr(self, 'curve_index', None) is None or len(self.curve_index) > len(self.curve_database):
+            self.curve_index = CurveIndex()
+        self.curve_index.sync(self.curve_database)
+        return self.curve_index
+
+    def warm_up(self):
+        """
+        build the curve index, so the first query doesn't pay for it
+        """
+        self.get_curve_index()
+
+    def nearest(self, curve, k=1, n_candidates=None):
+        """
+        :param n_candidates: re-rank only this many signature neighbors (approximate), by default the search is exact
+        :return: list of (normA distance, db curve, assembly) of the k closest db curves, closest first
+        """
+        return [(distance, self.curve_database[idx], self.database[idx])
+                for distance, idx in self.get_curve_index().nearest(curve, k=k, n_candidates=n_candidates,
+                                                                    exact=not n_candidates)]
+
+    def get_closest_curve(self, curve, get_all_dis=False, n_candidates=None):
+        """
+        :param n_candidates: if given, only the n_candidates curves with the closest signatures are
+                             compared by normA (recall/speed knob), otherwise the whole db is scanned
+        """
+        if n_candidates and not get_all_dis:
+            min_dis, idx = self.get_curve_index().nearest(curve, k=1, n_candidates=n_candidates)[0]
+            return self.curve_database[idx], self.database[idx], None
 
         min_dis = curve.normA(curve, self.curve_database[0])
         min_curve = self.curve_database[0]
@@ -105,25 +347,101 @@ class AssemblyA_Sampler:
         return min_curve, closest_assembly, all_dist if get_all_dis else None
 
     def save(self, path=pjoin('dbs', 'new_db')):
+        """
+        save the db as a numpy .npz file (whatever the extension of path): a config record per assembly
+        (see config_records) and the points and features of the curves, nothing is pickled
+        """
+        from config_records import to_records
+        curves = self.curve_database
         with open(path, "wb") as handle:
-            dill.dump(self, handle)
+            np.savez(handle, format_version=DB_FORMAT_VERSION, configs=to_records(self.database),
+                     curve_points=np.concatenate([c.points for c in curves]) if curves else np.zeros((0, 3)),
+                     curve_lengths=np.array([len(c.points) for c in curves], dtype=np.int64),
+                     curve_features=np.array([c.features for c in curves], dtype=np.float64).reshape(len(curves), 6),
+                     descriptor_version=Curve.DESCRIPTOR_VERSION, number_of_points=self.number_of_points,
+                     num_of_samples_around=self.num_of_samples_around)
+
+    def refresh_curve_descriptors(self):
+        """
+        recompute the stored curve descriptors that are missing or were computed with an older tag
+        :return: number of recomputed curves
+        """
+        return sum(db_curve.refresh_descriptors() for db_curve in self.curve_database)
 
     @staticmethod
     def load(destination_path):
+        """
+        load a db written by save, or an old dill pickled db (saving it again converts it)
+        """
         with open(destination_path, 'rb') as input_file:
-            sample = dill.load(input_file)
+            # npz files are zip archives
+            is_records = input_file.read(2) == b'PK'
+        if is_records:
+            sample = AssemblyA_Sampler._load_records(destination_path)
+        else:
+            with open(destination_path, 'rb') as input_file:
+                sample = dill.load(input_file)
+        sample.refresh_curve_descriptors()
+        return sample
+
+    @staticmethod
+    def _load_records(path):
+        from config_records import AssemblyRecords
+        with np.load(path) as data:
+            if int(data['format_version']) > DB_FORMAT_VERSION:
+                raise ValueError(f"{path} was written by a newer version (db format {int(data['format_version'])})")
+            sample = AssemblyA_Sampler(number_of_points=int(data['number_of_points']),
+                                       num_of_samples_around=int(data['num_of_samples_around']))
+            lengths = data['curve_lengths']
+            points = np.split(data['curve_points'], np.cumsum(lengths)[:-1]) if len(lengths) else []
+            if int(data['descriptor_version']) == Curve.DESCRIPTOR_VERSION:
+                sample.curve_database = [Curve.from_features(p, f) for p, f in zip(points, data['curve_features'])]
+            else:
+                sample.curve_database = [Curve(p) for p in points]
+            # the assemblies are built from their records on first access
+            sample.database = AssemblyRecords(data['configs'])
         return sample
 
-    def plot_all_db(self):
-        if not os.path.exists('db_plots'):
-            #     os.rmdir('db_plots')
-            os.mkdir('db_plots')
-        for i, cur in enumerate(self.get_curve_database()):
-            fig, ax = cur.plot_curve()
-            fig.savefig(pjoin('db_plots', f'{i}.png'))
+    def plot_all_db(self, out_dir='db_plots', workers=1, incremental=False):
+        """
+        save an image of every db curve to <out_dir>/<index>.png
+        :param workers: number of rendering processes
+        :param incremental: only render curves that don't have an image yet
+        """
+        from rendering import render_curves
+        return render_curves(self.get_curve_database(), out_dir=out_dir, workers=workers, incremental=incremental)
 
-    def plot_with_figure(self, idx, figure='snake'):
+    @staticmethod
+    def get_unnormalized_curve(driving_mech, combined, figure_name, number_of_points=360, cache_path=None):
+        """
+        the curve traced by combined (driving_mech driving the figure figure_name), from the curve cache if possible
+        :param cache_path: curve cache file, shared with any other process using the same file
+        """
+        from curve_cache import CurveCache, curve_key
+        cache = CurveCache(cache_path or CURVE_CACHE_PATH)
+        key = curve_key(driving_mech.config, figure=figure_name, number_of_points=number_of_points)
+        points = cache.get(key)
+        if points is None:
+            print("generating unnormalized curve")
+            curve = get_assembly_curve(combined, number_of_points=number_of_points)
+            cache.put(key, curve.points)
+        else:
+            curve = Curve(points)
+        cache.close()
+        return curve
 
+    def plot_with_figure(self, idx, figure='snake', format='gif', out_dir='gifs'):
+        """
+        animate a db assembly driving a figure, the frames are rendered and encoded in memory
+        :param figure: 'man', 'snake' or None for the assembly alone
+        :param format: 'gif', 'webp' or 'mp4'
+        :return: path of the written animation
+        """
+        from rendering import AssemblyAnimator, encode_animation
+        from motion_table import get_motion_table
+        from curve_cache import curve_key
+
+        figure_name = figure
         driving_mech = self.get_database()[idx]
         driving_mech.update_state2()
 
@@ -138,51 +456,19 @@ class AssemblyA_Sampler:
         else:
             combined = driving_mech
 
-        if not os.path.exists(pjoin('unnormalized_curves', f'{idx}')):
-            print("generating unnormalized curve")
-            curve = get_assembly_curve(combined)
-            if not os.path.exists('unnormalized_curves'):
-                os.mkdir('unnormalized_curves')
-            with open(pjoin('unnormalized_curves', f'{idx}'), 'wb') as f:
-                dill.dump(curve, f)
-        else:
-            with open(pjoin('unnormalized_curves', f'{idx}'), 'rb') as f:
-                curve = dill.load(f)
-
-        if not os.path.exists('images'):
-            os.mkdir('images')
-        if not os.path.exists(pjoin('images', f'{idx}')):
-            os.mkdir(pjoin('images', f'{idx}'))
+        curve = self.get_unnormalized_curve(driving_mech, combined, figure_name)
+        motion_key = curve_key(driving_mech.config, figure=figure_name, number_of_points=72)
+        motion_table = get_motion_table(combined, motion_key)
 
-        fig_tup = curve.plot_curve()
-        combined.plot_assembly(plot_path=pjoin('images', f'{idx}'),
-                               save_images=True,
-                               image_number=0,
-                               user_fig=figure,
-                               fig_tup=fig_tup)
+        animator = AssemblyAnimator(combined, curve=curve, user_fig=figure)
+        print("generating motion frames")
+        frames = animator.frames(number_of_frames=72, step_angle=5, motion_table=motion_table)
+        animator.close()
 
-        print("generating motion images")
-
-        for i in tqdm(range(72)):
-            combined.actuator.turn(5)
-            combined.update_state2()
-            fig_tup = curve.plot_curve()
-            combined.plot_assembly(plot_path=pjoin('images', f'{idx}'),
-                                   save_images=True,
-                                   image_number=i + 1,
-                                   user_fig=figure,
-                                   fig_tup=fig_tup)
-            plt.close()
-
-        frames = []
-        for i in range(72):
-            new_frame = Image.open(pjoin('images', f'{idx}', f'{i}.png'))
-            frames.append(new_frame)
-
-        if not os.path.exists('gifs'):
-            os.mkdir('gifs')
-        # Save into a GIF file that loops forever
-        frames[0].save(pjoin('gifs', f'{idx}.gif'), format='GIF',
-                       append_images=frames[1:],
-                       save_all=True,
-                       duration=5, loop=0)
+        if not os.path.exists(out_dir):
+            os.mkdir(out_dir)
+        # Save into an animation file that loops forever
+        path = pjoin(out_dir, f'{idx}.{format}')
+        with open(path, 'wb') as f:
+            f.write(encode_animation(frames, format=format, duration=5))
+        return path
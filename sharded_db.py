@@ -0,0 +1,151 @@
+import os
+import json
+import heapq
+import argparse
+import threading
+from itertools import chain
+from os.path import join as pjoin
+from concurrent.futures import ThreadPoolExecutor
+from curve import Curve
+from sampler import AssemblyA_Sampler
+
+MANIFEST_NAME = 'manifest.json'
+# version of the manifest layout
+SHARDS_FORMAT_VERSION = 1
+
+
+class ShardedDatabase:
+    '''
+    a db split over shard files in a directory, listed by a json manifest.
+    every shard is a db file written by AssemblyA_Sampler.save and is loaded the first time it is used
+    '''
+
+    def __init__(self, directory):
+        self.directory = directory
+        manifest_path = pjoin(directory, MANIFEST_NAME)
+        if os.path.exists(manifest_path):
+            with open(manifest_path, 'r') as f:
+                self.manifest = json.load(f)
+            if self.manifest['format_version'] > SHARDS_FORMAT_VERSION:
+                raise ValueError(f"{directory} was written by a newer version (format {self.manifest['format_version']})")
+        else:
+            self.manifest = {'format_version': SHARDS_FORMAT_VERSION, 'shards': []}
+        self._shards = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def is_sharded(path):
+        return os.path.isdir(path) and os.path.exists(pjoin(path, MANIFEST_NAME))
+
+    def __len__(self):
+        return sum(shard['size'] for shard in self.manifest['shards'])
+
+    def shard_count(self):
+        return len(self.manifest['shards'])
+
+    def _write_manifest(self):
+        # write and rename, so readers never see a half written manifest
+        path = pjoin(self.directory, MANIFEST_NAME)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(path + '.tmp', path)
+
+    def add_shard(self, sample, name=None):
+        """
+        save sample as a new shard
+        :param name: file name of the shard in the directory
+        :return: index of the shard
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        name = name or f'shard_{self.shard_count():04d}.npz'
+        if any(shard['file'] == name for shard in self.manifest['shards']):
+            raise ValueError(f"shard {name} already exists")
+        sample.save(pjoin(self.directory, name))
+        with self._lock:
+            self._shards[self.shard_count()] = sample
+        self.manifest['shards'].append({'file': name, 'size': len(sample.database),
+                                        'number_of_points': sample.number_of_points})
+        self._write_manifest()
+        return self.shard_count() - 1
+
+    def get_shard(self, i):
+        """
+        :return: the AssemblyA_Sampler of shard i
+        """
+        with self._lock:
+            if i not in self._shards:
+                self._shards[i] = AssemblyA_Sampler.load(pjoin(self.directory, self.manifest['shards'][i]['file']))
+            return self._shards[i]
+
+    def warm_up(self):
+        """
+        load every shard and build its curve index
+        """
+        for i in range(self.shard_count()):
+            self.get_shard(i).warm_up()
+
+    def nearest(self, curve, k=1, n_candidates=None, workers=4):
+        """
+        query all the shards in parallel and merge their results
+        :param n_candidates: re-rank only this many signature neighbors per shard (approximate),
+                             by default the search is exact
+        :return: list of (normA distance, db curve, assembly) of the k closest curves of all the shards, closest first
+        """
+        def query(i):
+            index = self.get_shard(i).get_curve_index()
+            return [(distance, i, idx) for distance, idx in
+                    index.nearest(curve, k=k, n_candidates=n_candidates, exact=not n_candidates)]
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(query, range(self.shard_count())))
+        # only the winners' assemblies are built
+        return [(distance, self.get_shard(i).curve_database[idx], self.get_shard(i).database[idx])
+                for distance, i, idx in heapq.nsmallest(k, chain(*results))]
+
+    def merge(self, gamma=1):
+        """
+        :return: an AssemblyA_Sampler of the assemblies of all the shards in shard order, without the ones whose
+                 curve is within gamma of an already merged curve (the is_dissimilar rule)
+        """
+        from config_records import AssemblyRecords
+        shards = self.manifest['shards']
+        merged = AssemblyA_Sampler(number_of_points=shards[0]['number_of_points'] if shards else 72)
+        merged.database = AssemblyRecords()
+        for i in range(self.shard_count()):
+            merged.merge(self.get_shard(i), gamma=gamma)
+        return merged
+
+
+parser = argparse.ArgumentParser(description='manage a sharded db directory')
+subparsers = parser.add_subparsers(dest='command', required=True)
+add_parser = subparsers.add_parser('add', help='add db files as shards, the directory is created if needed')
+add_parser.add_argument('directory', type=str)
+add_parser.add_argument('db_paths', type=str, nargs='+')
+merge_parser = subparsers.add_parser('merge', help='merge all the shards to a single db file, dropping duplicates')
+merge_parser.add_argument('directory', type=str)
+merge_parser.add_argument('output_path', type=str)
+merge_parser.add_argument('--gamma', type=float, default=1, help='curves closer than gamma (normA) are duplicates')
+query_parser = subparsers.add_parser('query', help='print the k closest db curves of a json points list')
+query_parser.add_argument('directory', type=str)
+query_parser.add_argument('json_path', type=str)
+query_parser.add_argument('--k', type=int, default=5)
+query_parser.add_argument('--candidates', type=int, default=None,
+                          help='only re-rank this many curves with the closest signatures per shard')
+query_parser.add_argument('--workers', type=int, default=4, help='shards queried in parallel')
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    db = ShardedDatabase(args.directory)
+    if args.command == 'add':
+        for db_path in args.db_paths:
+            print(f'{db_path} -> shard {db.add_shard(AssemblyA_Sampler.load(db_path))}')
+    elif args.command == 'merge':
+        merged = db.merge(gamma=args.gamma)
+        merged.save(args.output_path)
+        print(f'merged {len(merged.database)} of {len(db)} assemblies')
+    else:
+        with open(args.json_path, 'r') as j:
+            curve = Curve(json.loads(j.read()))
+        for distance, db_curve, assembly in db.nearest(curve, k=args.k, n_candidates=args.candidates,
+                                                       workers=args.workers):
+            print(json.dumps({'distance': distance, 'components': assembly.describe_assembly()}))
@@ -0,0 +1,123 @@
+import os
+import json
+import time
+import threading
+
+# off by default, every recording call then returns right away.
+# set MECHANICAL_CHARACTERS_SOLVER_STATS=1 or call enable()
+ENABLED = os.environ.get('MECHANICAL_CHARACTERS_SOLVER_STATS', '') not in ('', '0')
+
+COUNTERS = ('calls', 'failures', 'iterations', 'function_evaluations', 'jacobian_evaluations', 'wall_time_s',
+            'traced_points', 'dropped_points', 'broken_traces')
+
+PROMETHEUS_HELP = {'calls': 'solver calls',
+                   'failures': 'solver calls that did not converge',
+                   'iterations': 'solver iterations',
+                   'function_evaluations': 'constraint evaluations',
+                   'jacobian_evaluations': 'constraint jacobian evaluations',
+                   'wall_time_s': 'seconds spent in the solver',
+                   'traced_points': 'curve points traced',
+                   'dropped_points': 'curve points dropped because the solver failed',
+                   'broken_traces': 'curve traces stopped because the assembly lost its branch'}
+
+
+class SolverStats:
+    '''
+    counters of solver work: calls, iterations, function and jacobian evaluations, failures and wall time,
+    and the points traced and dropped by curve tracing
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = dict.fromkeys(COUNTERS, 0)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def add(self, **counts):
+        with self._lock:
+            for name, value in counts.items():
+                self.counts[name] += value
+
+    def reset(self):
+        with self._lock:
+            self.counts = dict.fromkeys(COUNTERS, 0)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.counts)
+
+    def to_json(self):
+        return json.dumps(self.snapshot())
+
+    def to_prometheus(self, prefix='mechanical_characters_solver', labels=None):
+        """
+        :param labels: dict of prometheus labels added to every sample
+        :return: the counters in the prometheus text exposition format
+        """
+        label_text = ','.join(f'{k}="{v}"' for k, v in (labels or {}).items())
+        label_text = '{' + label_text + '}' if label_text else ''
+        lines = []
+        for name, value in self.snapshot().items():
+            lines.append(f'# HELP {prefix}_{name} {PROMETHEUS_HELP[name]}')
+            lines.append(f'# TYPE {prefix}_{name} counter')
+            lines.append(f'{prefix}_{name}{label_text} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+# totals over every assembly of the process
+global_stats = SolverStats()
+
+
+def enable(enabled=True):
+    global ENABLED
+    ENABLED = enabled
+
+
+def start():
+    """
+    :return: a start time to pass to record_solve, or None when disabled
+    """
+    return time.perf_counter() if ENABLED else None
+
+
+def assembly_stats(assembly):
+    """
+    :return: the stats of one assembly, created on first use
+    """
+    if assembly.stats is None:
+        assembly.stats = SolverStats()
+    return assembly.stats
+
+
+def record_solve(assembly, start_time, res, success):
+    """
+    record one solver call of assembly, in its stats and in the global stats
+    :param start_time: the value start() returned before the solve
+    :param res: the scipy OptimizeResult
+    """
+    if start_time is None:
+        return
+    counts = dict(calls=1, failures=int(not success), iterations=int(res.get('nit', 0)),
+                  function_evaluations=int(res.get('nfev', 0)), jacobian_evaluations=int(res.get('njev', 0) or 0),
+                  wall_time_s=time.perf_counter() - start_time)
+    assembly_stats(assembly).add(**counts)
+    global_stats.add(**counts)
+
+
+def record_trace(assembly, traced, dropped, broken=False):
+    """
+    record the points a curve trace of assembly kept and dropped
+    :param broken: the trace was stopped at a broken step, the rest of its points are counted as dropped
+    """
+    if not ENABLED:
+        return
+    counts = dict(traced_points=traced, dropped_points=dropped, broken_traces=int(broken))
+    assembly_stats(assembly).add(**counts)
+    global_stats.add(**counts)
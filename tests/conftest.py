@@ -0,0 +1,30 @@
+import os
+import sys
+import pytest
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+
+@pytest.fixture
+def synthetic_curves():
+    """
+    :return: a function (n, seed) -> n random smooth closed curves in the xy plane, normalized like db curves
+    """
+    from curve import Curve
+    from assembly import normalize_curve2
+
+    def make(n, seed=0, number_of_points=72, harmonics=4):
+        rng = np.random.RandomState(seed)
+        t = np.linspace(0, 2 * np.pi, number_of_points, endpoint=False)
+        k = np.arange(1, harmonics + 1)
+        curves = []
+        for _ in range(n):
+            # decaying random fourier coefficients per axis
+            coefficients = rng.randn(2, 2, harmonics) / k ** 2
+            xy = (coefficients[:, 0] @ np.cos(np.outer(k, t)) + coefficients[:, 1] @ np.sin(np.outer(k, t))).T
+            curves.append(Curve(normalize_curve2(np.column_stack([xy, np.zeros(number_of_points)]))))
+        return curves
+
+    return make
@@ -0,0 +1,208 @@
+import numpy as np
+import pytest
+from assembly import (Assembly, AssemblyA, return_prototype, return_prototype2, return_prototype3, StickSnake,
+                      get_assembly_curve, resample_closed_curve, trace_coarse_curve)
+from connections2 import FixedConnection2
+from curve import Curve
+from parts import Gear
+from sampler import AssemblyA_Sampler
+
+
+def test_local_ids():
+    mech = return_prototype()
+    assert [comp.id for comp in mech.all_components()] == list(range(len(mech.all_components())))
+    assert [con.id for con in mech.con_list] == list(range(len(mech.con_list)))
+
+
+def test_merge_leaves_the_driving_assembly_untouched():
+    mech = return_prototype()
+    mech.update_state2()
+    ids = [comp.id for comp in mech.all_components()]
+    state = dict(mech.cur_state)
+    red_point = mech.get_red_point_position()
+    snake = StickSnake()
+    snake.update_state2()
+    combined = snake.add_driving_assembly(mech)
+    combined.actuator.turn(30)
+    assert combined.update_state2()
+    assert [comp.id for comp in mech.all_components()] == ids
+    assert mech.cur_state == state
+    assert np.allclose(mech.get_red_point_position(), red_point)
+    # the merged ids are unique and the snake keeps its components
+    merged_ids = [comp.id for comp in combined.all_components()]
+    assert len(set(merged_ids)) == len(merged_ids)
+    assert all(any(comp is c for c in combined.components) for comp in snake.components)
+
+
+@pytest.mark.parametrize('prototype', [return_prototype2, return_prototype3])
+def test_presolve_matches_solving_all_params(prototype, monkeypatch):
+    # least squares converges tighter than bfgs, whose stopping tolerance leaves differences of about 1e-4
+    monkeypatch.setattr(Assembly, 'solver', 'sparse')
+    presolved = prototype()
+    assert len(presolved._free_idx) < len(presolved.param_index)
+    expected = get_assembly_curve(presolved, number_of_points=36)
+    monkeypatch.setattr(Assembly, 'presolve_params', False)
+    all_free = prototype()
+    assert len(all_free._free_idx) == len(all_free.param_index)
+    assert np.allclose(get_assembly_curve(all_free, number_of_points=36).points, expected.points, atol=1e-5)
+
+
+def test_state_updates_take_a_full_or_a_free_state():
+    mech = return_prototype2()
+    state = mech.get_cur_state_array()
+    with pytest.raises(ValueError):
+        mech.update_cur_state_from_array(state[mech._free_idx])
+    mech.update_cur_state_from_free(state[mech._free_idx])
+    assert np.allclose(mech.get_cur_state_array(), state)
+
+
+def as_3d(assembly):
+    """
+    the same components and connections solved over all 6 params of every component
+    """
+    return Assembly(assembly.con_list, assembly.components, actuator=assembly.actuator,
+                    red_point_component=assembly.red_point_component, planar=False)
+
+
+@pytest.mark.parametrize('prototype', [return_prototype, return_prototype2, return_prototype3])
+def test_planar_model_matches_3d_model(prototype, monkeypatch):
+    # least squares converges tighter than bfgs
+    monkeypatch.setattr(Assembly, 'solver', 'sparse')
+    planar = prototype()
+    assert planar.planar
+    spatial = as_3d(prototype())
+    assert not spatial.planar and len(spatial.param_index) == 2 * len(planar.param_index)
+    planar_points = get_assembly_curve(planar, number_of_points=36).points
+    spatial_points = get_assembly_curve(spatial, number_of_points=36).points
+    assert np.allclose(planar_points, spatial_points, atol=1e-5)
+    assert np.allclose(spatial_points[:, 2], 0, atol=1e-6)
+
+
+def test_planar_assembly_rejects_non_planar_connections():
+    mech = return_prototype()
+    gear = Gear(1)
+    with pytest.raises(ValueError):
+        mech.extend_assembly([gear], [FixedConnection2(gear, np.array([0.0, 0.0, 1.0]), np.array([0.0, 0.0, 0.0]))])
+
+
+def trace_with_solver(make_assembly, solver, number_of_points=24):
+    assembly = make_assembly()
+    assembly.solver = solver
+    assembly.update_state2()
+    return get_assembly_curve(assembly, number_of_points=number_of_points).points
+
+
+def snake_driven_by_prototype():
+    snake = StickSnake()
+    snake.update_state2()
+    return snake.add_driving_assembly(return_prototype())
+
+
+@pytest.mark.parametrize('make_assembly', [return_prototype2, snake_driven_by_prototype])
+def test_sparse_solver_matches_bfgs(make_assembly):
+    assert np.allclose(trace_with_solver(make_assembly, 'sparse'), trace_with_solver(make_assembly, 'bfgs'),
+                       atol=1e-4)
+
+
+def test_auto_solver_switches_to_sparse_for_large_merged_assemblies(monkeypatch):
+    mech = return_prototype()
+    combined = snake_driven_by_prototype()
+    # the planar merge has 36 params, the threshold is put between it and its parts
+    monkeypatch.setattr(Assembly, 'SPARSE_SOLVER_MIN_PARAMS', 30)
+    assert not mech.uses_sparse_solver()
+    assert combined.uses_sparse_solver()
+    calls = []
+    sparse_solve = Assembly.update_state_sparse
+    monkeypatch.setattr(Assembly, 'update_state_sparse', lambda self: calls.append(self) or sparse_solve(self))
+    auto = trace_with_solver(snake_driven_by_prototype, 'auto')
+    assert calls
+    assert np.allclose(auto, trace_with_solver(snake_driven_by_prototype, 'bfgs'), atol=1e-4)
+
+
+def test_merged_assembly_matches_one_built_at_once():
+    merged = snake_driven_by_prototype()
+    initial_state = dict(merged.cur_state)
+    # the same components and connections, compiled in one go
+    at_once = Assembly(list(merged.con_list), list(merged.components), actuator=merged.actuator,
+                       red_point_component=merged.red_point_component, initial_state=initial_state, solve=False,
+                       local_ids=False)
+    assert at_once.param_index.keys() == merged.param_index.keys()
+    params = list(merged.param_index)
+    assert ({params[i] for i in merged._free_idx} ==
+            {p for p, i in at_once.param_index.items() if i in set(at_once._free_idx)})
+    # the same residuals and jacobian entries at the same (unsolved) state, the rows are in plan order
+    state = np.array([initial_state[p] for p in params], dtype=np.float64) + 0.1
+    at_once_state = np.zeros(len(state))
+    at_once_state[[at_once.param_index[p] for p in params]] = state
+    assert np.allclose(merged.constraint_residuals(state), at_once.constraint_residuals(at_once_state))
+    jacobian = merged.constraint_jacobian(state).toarray()
+    at_once_jacobian = at_once.constraint_jacobian(at_once_state).toarray()
+    assert np.allclose(jacobian, at_once_jacobian[:, [at_once.param_index[p] for p in params]])
+    # both solve from the same state at the same actuator angle
+    merged.actuator.turn(20)
+    assert merged.update_state2()
+    solved = dict(merged.cur_state)
+    assert at_once.update_state2()
+    for param, value in solved.items():
+        assert np.isclose(at_once.cur_state[param], value, atol=1e-4)
+
+
+def rocker_config():
+    """
+    a sampled assembly that can't reach its first actuator angle, the solver converges to a pose that doesn't close
+    """
+    return {'gear1_init_parameters': {'radius': 3.41}, 'stick1_init_parameters': {'length': 15.12},
+            'gear2_init_parameters': {'radius': 3.41}, 'stick2_init_parameters': {'length': 18.11},
+            'gear1_fixed_position': np.array([-0.32, 1.34, 0.0]), 'gear2_fixed_position': np.array([10.95, 1.77, 0.0]),
+            'gear1_fixed_orientation': np.array([0.0, 0.0, 0.5 * np.pi]),
+            'gear2_fixed_orientation': np.array([0.0, 0.0, 0.5 * np.pi]),
+            'gear1_stick1_joint_location': np.array([3.23, -0.13, 0.0]),
+            'stick1_gear1_joint_location': np.array([0.0, 0.0, 0.0]),
+            'gear2_stick2_joint_location': np.array([-1.86, 0.55, 0.0]),
+            'stick2_gear2_joint_location': np.array([0.0, 0.0, 0.0]),
+            'stick1_stick2_joint_location': np.array([10.42, 0.0, 0.0]),
+            'stick2_stick1_joint_location': np.array([16.94, 0.0, 0.0])}
+
+
+def test_check_branch_keeps_clean_traces():
+    checked = get_assembly_curve(return_prototype(), number_of_points=36, check_branch=True)
+    assert np.array_equal(checked.points, get_assembly_curve(return_prototype(), number_of_points=36).points)
+
+
+def test_check_branch_stops_a_trace_that_does_not_close():
+    assert get_assembly_curve(AssemblyA(rocker_config()), number_of_points=72, check_branch=True) is None
+    # unchecked, the trace comes back whole
+    assert len(get_assembly_curve(AssemblyA(rocker_config()), number_of_points=72).points) == 72
+
+
+def test_short_and_broken_traces_are_not_full():
+    sample = AssemblyA_Sampler(number_of_points=4)
+    points = [[0, 0, 0], [1, 0, 0], [1, 1, 0], [0, 1, 0]]
+    assert sample.is_full_trace(Curve(points))
+    assert not sample.is_full_trace(Curve(points[:3]))
+    assert not sample.is_full_trace(None)
+
+
+@pytest.mark.parametrize('coarse_points', [9, 12])
+def test_resample_reproduces_a_band_limited_curve(coarse_points):
+    rng = np.random.RandomState(0)
+    harmonics = (coarse_points - 1) // 2
+    coefficients = rng.randn(2, 3, harmonics)
+    k = np.arange(1, harmonics + 1)
+
+    def sample(number_of_points):
+        t = np.linspace(0, 2 * np.pi, number_of_points, endpoint=False)
+        return 1.5 + coefficients[0] @ np.cos(np.outer(k, t)) + coefficients[1] @ np.sin(np.outer(k, t))
+
+    resampled = resample_closed_curve(sample(coarse_points).T, 72)
+    assert resampled.shape == (72, 3)
+    assert np.allclose(resampled, sample(72).T, atol=1e-12)
+
+
+@pytest.mark.parametrize('prototype', [return_prototype2, return_prototype3])
+def test_trace_with_known_states_matches_plain_trace(prototype):
+    _, states = trace_coarse_curve(prototype(), 12, 72)
+    assert sorted(states) == list(range(5, 72, 6))
+    plain = get_assembly_curve(prototype(), number_of_points=72)
+    known = get_assembly_curve(prototype(), number_of_points=72, known_states=states)
+    assert np.allclose(known.points, plain.points, atol=1e-3)
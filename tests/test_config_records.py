@@ -0,0 +1,77 @@
+import os
+import dill
+import numpy as np
+import db_plotting
+from assembly import return_prototype, return_prototype2, return_prototype3, get_assembly_curve
+from config_records import (RECORD_SIZE, AssemblyRecords, config_from_assembly, config_to_record,
+                            record_to_config, to_records)
+from sampler import AssemblyA_Sampler
+
+
+def assert_same_config(config, expected):
+    assert config.keys() == expected.keys()
+    for key, value in expected.items():
+        if isinstance(value, dict):
+            assert config[key] == value
+        else:
+            assert np.array_equal(config[key], value)
+
+
+def small_db(number_of_points=36):
+    sample = AssemblyA_Sampler(number_of_points=number_of_points)
+    for prototype in (return_prototype, return_prototype2):
+        sample.database.append(prototype())
+        sample.curve_database.append(get_assembly_curve(prototype(), number_of_points=number_of_points,
+                                                        normelaize_curve=True))
+    return sample
+
+
+def test_record_round_trip():
+    for prototype in (return_prototype, return_prototype2, return_prototype3):
+        assembly = prototype()
+        record = config_to_record(config_from_assembly(assembly))
+        assert record.shape == (RECORD_SIZE,)
+        assert_same_config(record_to_config(record), assembly.config)
+
+
+def test_assembly_records_round_trip():
+    assemblies = [return_prototype(), return_prototype2()]
+    records = AssemblyRecords()
+    records += assemblies
+    assert records[0] is assemblies[0]
+    rebuilt = AssemblyRecords(records.records())
+    assert len(rebuilt) == 2
+    for assembly, original in zip(rebuilt, assemblies):
+        assert_same_config(assembly.config, original.config)
+        assert np.allclose(assembly.get_red_point_position(), original.get_red_point_position())
+    assert np.array_equal(to_records(assemblies), records.records())
+
+
+def test_save_load_round_trip(tmp_path):
+    sample = small_db()
+    path = str(tmp_path / 'db')
+    sample.save(path)
+    loaded = AssemblyA_Sampler.load(path)
+    assert loaded.number_of_points == sample.number_of_points
+    assert np.array_equal(to_records(loaded.database), to_records(sample.database))
+    for curve, expected in zip(loaded.curve_database, sample.curve_database):
+        assert np.array_equal(curve.points, expected.points)
+        assert np.array_equal(curve.features, expected.features)
+
+
+def test_legacy_pickle_is_loaded(tmp_path):
+    sample = small_db()
+    path = str(tmp_path / 'old_db')
+    with open(path, 'wb') as f:
+        dill.dump(sample, f)
+    assert len(AssemblyA_Sampler.load(path).database) == 2
+
+
+def test_plot_saved_db(tmp_path, monkeypatch):
+    path = str(tmp_path / 'db')
+    small_db().save(path)
+    monkeypatch.chdir(tmp_path)
+    db_plotting.main(path)
+    assert sorted(os.listdir('db_plots')) == ['0.png', '1.png']
+    db_plotting.main(path, curve_idx=[1], format='gif')
+    assert os.listdir('gifs')
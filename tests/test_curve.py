@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+from curve import Curve
+
+
+def brute_force_normA(curve1, curve2):
+    """
+    normA with f7 and f8 minimized over every np.roll shift of the start point of curve2
+    """
+    num_p = len(curve1.points)
+    points2, curvature2 = curve2.points[:num_p], curve2._curvature[:num_p]
+    f7 = min(np.sum((curve1.points - np.roll(points2, -l, axis=0)) ** 2) for l in range(num_p))
+    f8 = min(np.sum((curve1._curvature - np.roll(curvature2, -l, axis=0)) ** 2) for l in range(num_p))
+    features = curve1.features - curve2.features
+    return np.sqrt(np.sum(Curve.A[:6] * features * features) + Curve.A[6] * f7 / num_p + Curve.A[7] * f8)
+
+
+@pytest.mark.parametrize('number_of_points', [25, 36, 71, 72])
+def test_normA_matches_brute_force_shift_search(synthetic_curves, number_of_points):
+    curves = synthetic_curves(6, seed=number_of_points, number_of_points=number_of_points)
+    for curve1 in curves[:3]:
+        for curve2 in curves[3:]:
+            assert np.isclose(Curve.normA(curve1, curve2), brute_force_normA(curve1, curve2), rtol=1e-9, atol=1e-9)
+
+
+def test_normA_of_a_shifted_curve(synthetic_curves):
+    curve = synthetic_curves(1, seed=1)[0]
+    shifted = Curve(np.roll(curve.points, 17, axis=0))
+    f7, f8 = Curve._shift_distances(curve, shifted)
+    assert f7 < 1e-6 and f8 < 1e-6
+
+
+def test_normA_against_a_longer_curve(synthetic_curves):
+    short = synthetic_curves(1, seed=2, number_of_points=36)[0]
+    long = synthetic_curves(1, seed=3, number_of_points=72)[0]
+    assert np.isclose(Curve.normA(short, long), brute_force_normA(short, long), rtol=1e-9, atol=1e-9)
@@ -0,0 +1,38 @@
+import numpy as np
+from assembly import return_prototype, return_prototype2, get_assembly_curve
+from curve_cache import CurveCache, curve_key
+from sampler import AssemblyA_Sampler
+
+
+def test_hit_returns_the_traced_curve(tmp_path):
+    cache_path = str(tmp_path / 'curves.sqlite')
+    mech = return_prototype()
+    miss = AssemblyA_Sampler.get_unnormalized_curve(mech, mech, None, number_of_points=36, cache_path=cache_path)
+    hit = AssemblyA_Sampler.get_unnormalized_curve(return_prototype(), None, None, number_of_points=36,
+                                                   cache_path=cache_path)
+    fresh = get_assembly_curve(return_prototype(), number_of_points=36)
+    assert np.array_equal(hit.points, fresh.points)
+    assert np.array_equal(hit.points, miss.points)
+    assert np.array_equal(hit.features, fresh.features)
+
+
+def test_key_depends_on_config_figure_and_resolution():
+    config = return_prototype().config
+    key = curve_key(config, figure='snake', number_of_points=72)
+    assert key == curve_key(return_prototype().config, figure='snake', number_of_points=72)
+    assert key != curve_key(return_prototype2().config, figure='snake', number_of_points=72)
+    assert key != curve_key(config, figure='man', number_of_points=72)
+    assert key != curve_key(config, figure='snake', number_of_points=36)
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    points = np.arange(30, dtype=np.float64).reshape(10, 3)
+    cache = CurveCache(str(tmp_path / 'curves.sqlite'), max_bytes=2 * points.nbytes)
+    cache.put('a', points)
+    cache.put('b', points + 1)
+    assert np.array_equal(cache.get('a'), points)
+    cache.put('c', points + 2)
+    assert cache.get('b') is None
+    assert np.array_equal(cache.get('a'), points)
+    assert len(cache) == 2
+    cache.close()
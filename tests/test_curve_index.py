@@ -0,0 +1,69 @@
+from curve import Curve
+from curve_index import CurveIndex
+
+
+def linear_scan(curve, curves):
+    return sorted((Curve.normA(curve, other), i) for i, other in enumerate(curves))
+
+
+def test_exact_nearest_matches_linear_scan(synthetic_curves):
+    curves = synthetic_curves(60, seed=1)
+    index = CurveIndex(curves, n_candidates=4)
+    for query in synthetic_curves(10, seed=2):
+        expected = linear_scan(query, curves)[:3]
+        result = index.nearest(query, k=3, exact=True)
+        assert [i for _, i in result] == [i for _, i in expected]
+        assert [d for d, _ in result] == [d for d, _ in expected]
+
+
+def test_approximate_nearest_returns_sorted_normA(synthetic_curves):
+    curves = synthetic_curves(40, seed=3)
+    index = CurveIndex(curves, n_candidates=8)
+    query = synthetic_curves(1, seed=4)[0]
+    result = index.nearest(query, k=5)
+    assert len(result) == 5
+    assert [d for d, _ in result] == sorted(d for d, _ in result)
+    for distance, i in result:
+        assert distance == Curve.normA(query, curves[i])
+
+
+def test_lower_bounds_do_not_exceed_normA(synthetic_curves):
+    curves = synthetic_curves(30, seed=5)
+    index = CurveIndex(curves)
+    query = synthetic_curves(1, seed=6)[0]
+    bounds = index.lower_bounds(query)
+    for bound, curve in zip(bounds, curves):
+        assert bound <= Curve.normA(query, curve) + 1e-9
+
+
+def test_empty_index():
+    assert CurveIndex().nearest(Curve([[0, 0, 0], [1, 0, 0], [0, 1, 0]])) == []
+
+
+def test_any_within_matches_linear_scan(synthetic_curves):
+    curves = synthetic_curves(50, seed=7)
+    index = CurveIndex(curves)
+    for query in synthetic_curves(10, seed=8):
+        closest = linear_scan(query, curves)[0][0]
+        for gamma in (closest * 0.5, closest, closest * 1.01, closest * 2):
+            assert index.any_within(query, gamma) == (closest < gamma)
+
+
+def test_any_within_finds_an_indexed_curve(synthetic_curves):
+    curves = synthetic_curves(20, seed=9)
+    index = CurveIndex(curves)
+    assert index.any_within(curves[7], 1e-6)
+    assert not CurveIndex().any_within(curves[7], 1.0)
+
+
+def test_sync_indexes_appended_curves(synthetic_curves):
+    curves = synthetic_curves(40, seed=10)
+    database = curves[:5]
+    index = CurveIndex(database)
+    # grows past the preallocated buffers
+    database += curves[5:]
+    index.sync(database)
+    assert len(index) == len(curves)
+    query = synthetic_curves(1, seed=11)[0]
+    assert index.nearest(query, k=2, exact=True) == CurveIndex(curves).nearest(query, k=2, exact=True)
+    assert index.any_within(curves[-1], 1e-6)
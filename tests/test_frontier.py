@@ -0,0 +1,68 @@
+import random
+import pytest
+from frontier import Frontier, BFSFrontier, NoveltyFrontier, RandomFrontier, make_frontier
+
+
+def test_incomplete_frontier_fails_on_creation():
+    class NoPop(Frontier):
+        def __len__(self):
+            return 0
+
+        def push(self, record, novelty=0.0):
+            pass
+
+    with pytest.raises(TypeError):
+        NoPop()
+
+
+def test_bfs_pops_oldest_and_drops_new_when_full():
+    frontier = BFSFrontier(max_size=3)
+    for record in range(5):
+        frontier.push(record)
+    assert frontier.dropped == 2
+    assert [frontier.pop() for _ in range(len(frontier))] == [0, 1, 2]
+
+
+def test_novelty_pops_most_novel_and_drops_least_novel_when_full():
+    frontier = NoveltyFrontier(max_size=3)
+    for record, novelty in [('a', 2.0), ('b', 5.0), ('c', 1.0), ('d', 3.0), ('e', 5.0)]:
+        frontier.push(record, novelty)
+    assert frontier.dropped == 2
+    # the newest among equals first
+    assert [frontier.pop() for _ in range(len(frontier))] == ['e', 'b', 'd']
+
+
+def test_random_keeps_max_size_and_pops_every_record():
+    frontier = RandomFrontier(max_size=10, rng=random.Random(0))
+    for record in range(25):
+        frontier.push(record)
+    assert len(frontier) == 10 and frontier.dropped == 15
+    popped = [frontier.pop() for _ in range(len(frontier))]
+    assert len(set(popped)) == 10 and set(popped) <= set(range(25))
+
+
+def test_make_frontier():
+    assert isinstance(make_frontier('novelty', max_size=5), NoveltyFrontier)
+    frontier = BFSFrontier()
+    assert make_frontier(frontier) is frontier
+    with pytest.raises(ValueError):
+        make_frontier('dfs')
+
+
+def test_novelty_matches_a_sorted_list():
+    rng = random.Random(1)
+    frontier = NoveltyFrontier(max_size=50)
+    reference = []
+    for step in range(2000):
+        if reference and rng.random() < 0.4:
+            assert frontier.pop() == reference.pop()[2]
+        else:
+            novelty = rng.choice([0.5, 1.0, rng.random()])
+            frontier.push(step, novelty)
+            reference = sorted(reference + [(novelty, step, step)])
+            if len(reference) > 50:
+                del reference[0]
+        assert len(frontier) == len(reference)
+    # the removed entries don't pile up in the heaps
+    assert len(frontier._max_heap) <= 2 * len(frontier) + 16
+    assert len(frontier._min_heap) <= 2 * len(frontier) + 16
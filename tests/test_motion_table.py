@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+from assembly import AssemblyA, return_prototype, return_prototype2
+from motion_table import MotionTable
+from test_assembly import rocker_config
+
+
+def test_baked_poses_match_the_solved_ones():
+    table = MotionTable.bake(return_prototype2(), steps=36)
+    assert table.solved.all()
+    mech = return_prototype2()
+    mech.actuator.turn(3 * 10)
+    mech.update_state2()
+    reference = return_prototype2()
+    table.apply(reference, 3 * 10)
+    for comp, solved_comp in zip(reference.components, mech.components):
+        assert np.allclose(comp.configuration.position.vector(), solved_comp.configuration.position.vector(),
+                           atol=1e-4)
+
+
+def test_start_pose_that_does_not_close_is_taken_one_turn_later():
+    # the first solve of return_prototype from the zero state doesn't close, the one after a cycle does
+    mech = return_prototype()
+    assert np.linalg.norm(mech.constraint_residuals(mech.presolve())) > MotionTable.max_residual
+    table = MotionTable.bake(mech, steps=36)
+    assert table.solved.all()
+    assert np.linalg.norm(mech.constraint_residuals(mech.presolve())) <= MotionTable.max_residual
+    # the assembly ended at the start angle, in the pose stored for it
+    end_pose = np.zeros(table.poses[0].shape, dtype=np.float32)
+    MotionTable._record_pose(mech, end_pose)
+    assert np.array_equal(table.poses[0], end_pose)
+
+
+def test_start_pose_that_does_not_close_is_not_solved():
+    rocker = AssemblyA(rocker_config())
+    assert np.linalg.norm(rocker.constraint_residuals(rocker.presolve())) > MotionTable.max_residual
+    assert not MotionTable.bake(rocker, steps=12).solved[0]
+
+
+def test_no_interpolation_across_unsolved_steps():
+    steps = 4
+    poses = np.zeros((steps, 1, 6))
+    poses[:, 0, 0] = np.arange(steps)
+    table = MotionTable(np.arange(steps) * 90.0, poses, np.array([True, True, False, True]))
+    assert np.allclose(table.pose_at(45)[0, 0], 0.5)
+    assert table.can_interpolate(90) and not table.can_interpolate(135) and not table.can_interpolate(225)
+    # the last step interpolates towards the first one
+    assert np.allclose(table.pose_at(315)[0, 0], 1.5)
+    with pytest.raises(ValueError):
+        table.pose_at(200)
@@ -0,0 +1,47 @@
+import pytest
+from assembly import MUTATION_GROUPS
+from mutation_policy import MutationPolicy, ACCEPTED, INVALID, SIMILAR
+
+
+def test_uniform_probabilities_at_start():
+    policy = MutationPolicy(base_prob=0.5)
+    assert policy.probabilities() == {group: 0.5 for group in MUTATION_GROUPS}
+
+
+def test_steps_shrink_on_invalid_and_grow_on_similar():
+    policy = MutationPolicy(shrink=0.5, grow=2.0, min_scale=0.25, max_scale=4.0)
+    policy.update(['gear1'], INVALID)
+    policy.update(['stick1'], SIMILAR)
+    assert policy.scales['gear1'] == 0.5
+    assert policy.scales['stick1'] == 2.0
+    assert policy.scales['gear2'] == 1.0
+    for _ in range(5):
+        policy.update(['gear1', 'stick1'], INVALID)
+        policy.update(['stick2'], SIMILAR)
+    assert policy.scales['gear1'] == 0.25
+    assert policy.scales['stick2'] == 4.0
+    assert policy.outcomes[INVALID] == 6 and policy.outcomes[SIMILAR] == 6
+
+
+def test_novelty_reward_decays_within_a_cell(synthetic_curves):
+    policy = MutationPolicy(cell_size=1e6)
+    curves = synthetic_curves(2, seed=0)
+    assert policy.novelty_reward(curves[0]) == 1
+    assert policy.novelty_reward(curves[1]) == 0.5
+    assert len(policy.coverage) == 1
+
+
+def test_rewarded_groups_are_mutated_more(synthetic_curves):
+    policy = MutationPolicy(cell_size=0.01)
+    for curve in synthetic_curves(10, seed=1):
+        policy.update(['gear1'], ACCEPTED, curve)
+        policy.update(['gear2'], INVALID)
+    probabilities = policy.probabilities()
+    assert probabilities['gear1'] > probabilities['stick1'] > probabilities['gear2']
+    assert all(policy.min_prob <= p <= policy.max_prob for p in probabilities.values())
+    assert policy.outcomes[ACCEPTED] == 10
+
+
+def test_unknown_outcome_is_rejected():
+    with pytest.raises(KeyError):
+        MutationPolicy().update(['gear1'], 'lost')
@@ -0,0 +1,58 @@
+import copy
+import random
+import numpy as np
+from assembly import AssemblyA, get_assembly_curve, is_dissimilar, is_vaild_assembleA, sample_from_cur_assemblyA
+from config_records import to_records
+from sampler import AssemblyA_Sampler, spawn_rngs
+
+
+def test_same_seed_gives_the_same_streams():
+    first = [rng.random() for rng in spawn_rngs(7, 3)]
+    assert first == [rng.random() for rng in spawn_rngs(7, 3)]
+    # every stream index gives its own stream
+    assert len(set(first)) == 3
+    assert first != [rng.random() for rng in spawn_rngs(8, 3)]
+    # the stream of a worker doesn't depend on the number of workers
+    assert [rng.random() for rng in spawn_rngs(7, 2)] == first[:2]
+
+
+def parallel_db(seed, workers):
+    sample = AssemblyA_Sampler(number_of_points=24, num_of_samples_around=3)
+    sample.create_database_parallel(8, seed=seed, workers=workers)
+    return sample
+
+
+def test_parallel_db_depends_only_on_seed_and_workers():
+    first, second = parallel_db(7, 2), parallel_db(7, 2)
+    assert len(first.database) > 0
+    assert np.array_equal(to_records(first.database), to_records(second.database))
+    assert len(first.curve_database) == len(second.curve_database)
+    for curve, other in zip(first.curve_database, second.curve_database):
+        assert np.array_equal(curve.points, other.points)
+    other_seed = parallel_db(8, 2)
+    assert not np.array_equal(to_records(first.database)[:1], to_records(other_seed.database)[:1])
+
+
+def test_probe_never_rejects_a_curve_the_full_trace_accepts():
+    rng = random.Random(5)
+    sample = AssemblyA_Sampler(rng=rng, num_of_samples_around=3)
+    sample.create_assemblyA_database(6)
+    index = sample.get_curve_index()
+    checked = rejected = 0
+    for assembly in sample.database[:4]:
+        for _ in range(5):
+            candidate = sample_from_cur_assemblyA(assembly, random_sample=0.5, rng=rng)
+            if not is_vaild_assembleA(candidate):
+                continue
+            curve = get_assembly_curve(AssemblyA(copy.deepcopy(candidate.config)),
+                                       number_of_points=sample.number_of_points, normelaize_curve=True,
+                                       check_branch=True)
+            if not sample.is_full_trace(curve):
+                continue
+            probe, _ = sample.probe_curve(candidate)
+            checked += 1
+            if probe is not None and not is_dissimilar(probe, index, gamma=sample.probe_gamma):
+                rejected += 1
+                assert not is_dissimilar(curve, index)
+    assert checked > 0
+    assert rejected > 0
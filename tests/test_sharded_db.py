@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+from assembly import return_prototype, return_prototype2, return_prototype3, get_assembly_curve
+from config_records import to_records
+from curve import Curve
+from sampler import AssemblyA_Sampler
+from sharded_db import ShardedDatabase
+
+NUMBER_OF_POINTS = 36
+
+
+@pytest.fixture(scope='module')
+def traced():
+    """
+    :return: dict prototype -> its normalized curve
+    """
+    return {prototype: get_assembly_curve(prototype(), number_of_points=NUMBER_OF_POINTS, normelaize_curve=True)
+            for prototype in (return_prototype, return_prototype2, return_prototype3)}
+
+
+def make_db(traced, prototypes):
+    sample = AssemblyA_Sampler(number_of_points=NUMBER_OF_POINTS)
+    for prototype in prototypes:
+        sample.database.append(prototype())
+        sample.curve_database.append(traced[prototype])
+    return sample
+
+
+def test_merge_drops_duplicates_across_shards(tmp_path, traced):
+    db = ShardedDatabase(str(tmp_path / 'shards'))
+    db.add_shard(make_db(traced, [return_prototype, return_prototype2]))
+    db.add_shard(make_db(traced, [return_prototype2, return_prototype3]))
+    assert len(db) == 4 and db.shard_count() == 2
+    # the manifest is read back by a new instance
+    db = ShardedDatabase(str(tmp_path / 'shards'))
+    merged = db.merge()
+    # a linear scan applying the is_dissimilar rule in shard order
+    expected = []
+    for prototype in [return_prototype, return_prototype2, return_prototype2, return_prototype3]:
+        if all(Curve.normA(traced[prototype], traced[other]) >= 1 for other in expected):
+            expected.append(prototype)
+    assert len(expected) == 3
+    assert len(merged.database) == len(expected)
+    assert np.array_equal(to_records(merged.database), to_records([prototype() for prototype in expected]))
+
+
+def test_nearest_matches_a_single_db(tmp_path, traced):
+    db = ShardedDatabase(str(tmp_path / 'shards'))
+    db.add_shard(make_db(traced, [return_prototype]))
+    db.add_shard(make_db(traced, [return_prototype2, return_prototype3]))
+    single = make_db(traced, [return_prototype, return_prototype2, return_prototype3])
+    query = traced[return_prototype2]
+    sharded = [distance for distance, _, _ in db.nearest(query, k=3, workers=2)]
+    assert sharded == [distance for distance, _, _ in single.nearest(query, k=3)]
+    assert sharded[0] < 1e-6
+
+
+def test_duplicate_shard_name_is_rejected(tmp_path, traced):
+    db = ShardedDatabase(str(tmp_path / 'shards'))
+    db.add_shard(make_db(traced, [return_prototype]), name='a.npz')
+    with pytest.raises(ValueError):
+        db.add_shard(make_db(traced, [return_prototype2]), name='a.npz')